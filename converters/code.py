@@ -1,3 +1,5 @@
+from html import escape
+
 from engine.converters import converter
 from engine.path import Path
 
@@ -163,4 +165,4 @@ def load_sourcecode_file(path: Path) -> str:
 	"""
 	sources = path.guess_text()
 	if sources:
-		return f'<pre><code class="language-{path.suffix.split(".")[-1]}">{sources.text}</code></pre>'
+		return f'<pre><code class="language-{path.suffix.split(".")[-1]}">{escape(sources.text, quote=False)}</code></pre>'
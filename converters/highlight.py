@@ -0,0 +1,49 @@
+import re
+from html import unescape
+
+from engine.converters import conversion_settings, post_converter
+from engine.logging import logger
+from engine.settings import settings
+
+try:
+	from pygments import highlight
+	from pygments.formatters.html import HtmlFormatter
+	from pygments.lexers import get_lexer_by_name, get_lexer_for_filename
+	from pygments.util import ClassNotFound
+except ImportError:
+	highlight = None
+
+conversion_settings.add('server_highlighting')
+
+CODE_BLOCK = re.compile(r'<pre><code class="(?:language|lang)-([\w+#.-]+)">(.*?)</code></pre>', re.DOTALL)
+"Code block with language produced by source code and markdown converters."
+
+if settings.get('server_highlighting', False) and highlight is None:
+	logger.warning('Pygments is not installed, code is highlighted by browser.')
+
+
+def _highlight_block(match: re.Match[str]) -> str:
+	language = match.group(1)
+	if language == 'mermaid':
+		return match.group(0)
+	try:
+		lexer = get_lexer_by_name(language)
+	except ClassNotFound:
+		try:
+			lexer = get_lexer_for_filename(f'code.{language}')
+		except ClassNotFound:
+			# left for highlight.js
+			return match.group(0)
+	return highlight(unescape(match.group(2)), lexer, HtmlFormatter())
+
+
+@post_converter
+def highlight_code(content: str) -> str:
+	"""
+	Highlight code blocks with Pygments once on conversion instead of highlight.js in browser on each view.
+
+	Enabled by server_highlighting setting in case Pygments is installed. Blocks of unknown languages and mermaid diagrams are left as is.
+	"""
+	if not settings.get('server_highlighting', False) or highlight is None or '<pre><code class="' not in content:
+		return content
+	return CODE_BLOCK.sub(_highlight_block, content)
@@ -1,50 +1,75 @@
-import re
+import threading
 
-from markdown import markdown
+from markdown import Markdown
+from markdown.extensions.footnotes import FootnoteExtension
 
-from engine.converters import converter
+from engine.converters import conversion_settings, converter
+from internallinks import InternalLinkExtension
+from engine.pageindex import page_index, split_label
 from engine.path import make_relative_url, Path
+from engine.settings import settings
+
+EXTENSION_CONFIGS: dict[str, dict] = {
+	'extra':      {
+		'footnotes':   {
+			'UNIQUE_IDS': True
+		},
+		'fenced_code': {
+			'lang_prefix': 'lang-'
+		}
+	},
+	'mdx_math':   {
+		'enable_dollar_delimiter': True,
+		'add_preview':             True
+	},
+	'admonition': {},
+	'toc':        {},
+	**settings.get('markdown_extensions', {})
+}
+"Markdown extensions and their configs. Extensions can be added or reconfigured with markdown_extensions table of settings."
+conversion_settings.add('markdown_extensions')
+
+_local = threading.local()
+
+
+def _get_markdown() -> Markdown:
+	"""
+	Markdown converter of current thread (forked worker processes get their own copies).
+
+	Building of converter registers all extensions and compiles their patterns, so it is built once and is reset between documents.
+	"""
+	if (md := getattr(_local, 'markdown', None)) is None:
+		md = _local.markdown = Markdown(extensions=[*EXTENSION_CONFIGS, InternalLinkExtension(build_url=make_internal_link)], extension_configs=EXTENSION_CONFIGS)
+		# reset increments prefix of unique footnote ids, so prefix of new converter is restored before each document and markup does not depend on conversion order
+		_local.footnotes = [(extension, extension.unique_prefix) for extension in md.registeredExtensions if isinstance(extension, FootnoteExtension)]
+		return md
+	for extension, prefix in _local.footnotes:
+		extension.unique_prefix = prefix - 1
+	return md.reset()
 
 
 @converter('.md')
 def load_markdown_file(path: Path) -> str:
 	"Convert markdown file to HTML."
 	if (content := path.guess_text()) is not None:
-		return markdown(content.text, extensions=['extra', 'mdx_math', 'admonition', 'toc', 'wikilinks'], extension_configs={
-			'extra':     {
-				'footnotes':   {
-					'UNIQUE_IDS': True
-				},
-				'fenced_code': {
-					'lang_prefix': 'lang-'
-				}
-			},
-			'mdx_math':  {
-				'enable_dollar_delimiter': True,
-				'add_preview':             True
-			},
-			'wikilinks': {
-				# 'pattern':   r'\[\[([\w0-9_ \t-/#]+)\]\]',
-				'build_url': make_internal_link
-			}
-		})
-
-
-def make_internal_link(label, *_):
+		return _get_markdown().convert(content.text)
+
+
+def make_internal_link(label: str, *_) -> tuple[str, str, str | None]:
+	"""
+	Resolve internal link by label.
+
+	:return: URL of link, its label and path of linked file relative to wiki directory or None in case file is not found.
+	"""
+	text = label
 	wiki_path = Path.cwd() / 'wiki'
-	label = re.sub(r'\s*/\s*', '/', label)
-	match = re.search(r'\s*#.*', label)
-	if match:
-		anchor = re.sub(r'\s*#\s*', '#', match.group())
-		label = label[:match.start(0)]
-	else:
-		anchor = ''
-	found = list(wiki_path.rglob(f'{label}*'))
-	if len(found) != 0:
-		name = found[0].name.split('.')[0]
-		label = str(found[0].relative_to(wiki_path))
+	label, anchor = split_label(label)
+	found = page_index.find(label)
+	if found is not None:
+		name = found.name.split('.')[0]
+		label = str(found.relative_to(wiki_path))
 	else:
 		name = label.split('/')[-1]
 	# if len(anchor) != 0:
 	# 	name = anchor[1:]
-	return f'{make_relative_url("wiki", Path(label),drop_extension=True)}{anchor}'
+	return f'{make_relative_url("wiki", Path(label),drop_extension=True)}{anchor}', text, found.relative_to(wiki_path).to_url_format() if found is not None else None
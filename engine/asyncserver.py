@@ -0,0 +1,91 @@
+"""Asynchronous HTTP 1.1 web server with persistent connections."""
+import asyncio
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from engine.handler import RequestHandler, handle_request_by_type
+from engine.logging import logger
+from engine.path import Path
+from engine.responses import BadRequestReponse
+from engine.router import FileSystemRouter, Router
+from engine.webserver import _is_keep_alive, _parse_request_headers, _process_request
+
+
+async def _serve_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, *, router: Router, handle: RequestHandler, executor: ThreadPoolExecutor, idle_timeout: float, max_requests: int):
+	"""
+	Serve requests of single connection one by one until client closes it, asks to close it or stays idle for too long.
+
+	Pipelined requests are read from stream buffer and answered in order of arrival.
+	"""
+	addr = writer.get_extra_info('peername')
+	logger.info('Connected by', addr)
+	loop = asyncio.get_running_loop()
+	try:
+		for served in range(1, max_requests + 1):
+			try:
+				head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), idle_timeout)
+			except (TimeoutError, asyncio.IncompleteReadError):
+				break
+			except asyncio.LimitOverrunError:
+				writer.write(bytes(BadRequestReponse()))
+				break
+			request = head.decode('utf-8', errors='replace')
+			if length := int(_parse_request_headers(request).get('content-length', 0) or 0):
+				await reader.readexactly(length)  # wiki does not accept request bodies
+			response = await loop.run_in_executor(executor, partial(_process_request, request, router=router, handle=handle))
+			response.keep_alive = _is_keep_alive(request) and served < max_requests
+			if response.keep_alive:
+				response.headers['Keep-Alive'] = f'timeout={int(idle_timeout)}, max={max_requests - served}'
+			logger.debug('\tSending response', response.code, response.text)
+			await response.send_async(writer)
+			if not response.keep_alive:
+				break
+	except (ConnectionError, ValueError) as e:
+		logger.debug(f'Connection error: {e}')
+	finally:
+		logger.debug('\tDisconnecting client\r\n')
+		writer.close()
+		try:
+			await writer.wait_closed()
+		except ConnectionError:
+			pass
+
+
+async def serve_async(interface: str = '0.0.0.0', port: int = 80, router: Router = FileSystemRouter(), handle: RequestHandler = handle_request_by_type, workers: int | None = None, idle_timeout: float = 5, max_requests: int = 100, server: socket.socket | None = None):
+	"""
+	Listen forever in event loop.
+
+	Routing and response generation run in thread pool so slow converters never block event loop.
+
+	:param interface: Interface IP v4 address or resolvable name (like "127.0.0.1" or "localhost") on which to serve. Use "0.0.0.0" for all connected interfaces.
+	:param port: Port on which to serve.
+	:param router: routing callback that must return requested path or None for 404 Error.
+	:param handle:  response body generation callback.
+	:param workers: amount of threads processing requests. Default is chosen by ThreadPoolExecutor.
+	:param idle_timeout: seconds to wait for the next request on persistent connection before closing it.
+	:param max_requests: maximum amount of requests served by single connection.
+	:param server: already listening socket, e.g. inherited from parent process. Interface and port are ignored in this case.
+	"""
+	if server is None:
+		logger.info(f'Hosting at http://{interface or "localhost"}:{port} of {Path.cwd().resolve().absolute()}.')
+		address = {'host': interface, 'port': port, 'backlog': 999}
+	else:
+		server.setblocking(False)
+		address = {'sock': server}
+	with ThreadPoolExecutor(max_workers=workers or None, thread_name_prefix='wiki-worker') as executor:
+		listener = await asyncio.start_server(partial(_serve_connection, router=router, handle=handle, executor=executor, idle_timeout=idle_timeout, max_requests=max_requests), **address)
+		async with listener:
+			await listener.serve_forever()
+
+
+def serve(interface: str = '0.0.0.0', port: int = 80, router: Router = FileSystemRouter(), handle: RequestHandler = handle_request_by_type, buble_sigint: bool = False, workers: int | None = None, idle_timeout: float = 5, max_requests: int = 100, server: socket.socket | None = None):
+	"""
+	Run asynchronous server forever. Arguments are the same as for serve_async.
+	"""
+	try:
+		asyncio.run(serve_async(interface=interface, port=port, router=router, handle=handle, workers=workers, idle_timeout=idle_timeout, max_requests=max_requests, server=server))
+	except KeyboardInterrupt:
+		logger.info('Exit')
+		if buble_sigint:
+			raise
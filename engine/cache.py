@@ -1,11 +1,31 @@
 from __future__ import annotations
 import dataclasses
+import multiprocessing
+import os
 import pickle
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError, wait
+from contextlib import contextmanager
 from hashlib import md5, sha1
+from time import monotonic, sleep, time
+from typing import Iterator
+from uuid import uuid4
 
-from engine.converters import get_content
+try:
+	import fcntl
+except ImportError:  # not available on Windows, conversions are coalesced only between threads then
+	fcntl = None
+
+from engine.converters import fingerprint as converters_fingerprint, get_content, stale_while_revalidate
+from engine.pageindex import page_index
 from engine.path import Path
 from engine.logging import logger
+from engine.search import DOCUMENTS_VERSION, make_document, SearchIndex
+from engine.settings import settings
+from engine.store import CacheStore
+from engine.watcher import watch as watch_directory, Watcher
 
 
 @dataclasses.dataclass
@@ -16,94 +36,599 @@ class CachedFile:
 	"SHA1 hash of original content."
 	content: str | None
 	"HTML markup converted from original content."
+	size: int | None = None
+	"Size of original file in bytes. None for entries migrated from cache version 1."
+	mtime_ns: int | None = None
+	"Modification time of original file in nanoseconds."
+	inode: int | None = None
+	"Inode (file index) of original file."
+	loaded: bool = dataclasses.field(default=True, repr=False, compare=False)
+	"Whether content has been read from persistent store. Is not persisted."
 
 	def has_changed(self, file: Path) -> bool:
 		"""
 		Whether cached file has changed.
+
+		Only file metadata (size, modification time, inode) is checked while it is the same as recorded. Otherwise, content hashes are compared.
 		"""
+		stat = file.stat()
+		if self.size is not None and stat.st_size != self.size:
+			return True
+		if (stat.st_size, stat.st_mtime_ns, stat.st_ino) == (self.size, self.mtime_ns, self.inode):
+			return False
 		f = CachedFile.from_file(file, None)
-		return f.md5 != self.md5 or f.sha1 != self.sha1
+		if f.md5 != self.md5 or f.sha1 != self.sha1:
+			return True
+		# content is the same (e.g. file was touched or copied) so remember new metadata to skip hashing next time
+		self.size, self.mtime_ns, self.inode = f.size, f.mtime_ns, f.inode
+		return False
+
+	def memory_size(self) -> int:
+		"""
+		Approximate amount of memory in bytes taken by content.
+		"""
+		return sys.getsizeof(self.content) if self.content is not None else 0
 
-	def serialize(self) -> dict[str, str]:
-		return dataclasses.asdict(self)
+	def serialize(self) -> dict[str, str | int | None]:
+		return {'md5': self.md5, 'sha1': self.sha1, 'content': self.content, 'size': self.size, 'mtime_ns': self.mtime_ns, 'inode': self.inode}
 
 	@staticmethod
-	def deserialize(data: dict[str, str]) -> CachedFile:
+	def deserialize(data: dict[str, str | int | None]) -> CachedFile:
 		return CachedFile(**data)
 
 	@staticmethod
 	def from_file(file: Path, content: str | None) -> CachedFile:
-		data = file.read_bytes()
-		return CachedFile(md5=md5(data).hexdigest(), sha1=sha1(data).hexdigest(), content=content)
+		with open(file, 'rb') as f:
+			stat = os.fstat(f.fileno())
+			data = f.read()
+		return CachedFile(md5=md5(data).hexdigest(), sha1=sha1(data).hexdigest(), content=content, size=stat.st_size, mtime_ns=stat.st_mtime_ns, inode=stat.st_ino)
+
+
+_LOCK_STRIPES = 64
+"Amount of lock files shared by entries converted at the same time."
+
+
+def _process_context() -> multiprocessing.context.BaseContext:
+	"""
+	Context of converting processes. Preload runs while server threads handle requests and forking multi-threaded process may copy locks held by other threads, so processes are started by fork server (or spawned where it is not available).
+	"""
+	return multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
 
 
 class Cache:
 
-	def __init__(self, path: Path, root: Path = Path.cwd() / 'wiki', preload: bool = True):
-		self._version = 1
+	def __init__(self, path: Path, root: Path = Path.cwd() / 'wiki', preload: bool = True, memory_limit: int = 0, preload_workers: int = 1, convert_timeout: float = 120):
+		"""
+		:param path: path to persistent store (SQLite database). Legacy pickled cache with the same name and .pkl suffix is imported once.
+		:param root: directory of cached files.
+		:param preload: whether to purge and convert all files at once. Otherwise, use warm_up() later.
+		:param memory_limit: maximum amount of bytes taken by contents kept in memory. The least recently used contents are evicted and read from persistent store again on demand. Use 0 for no limit.
+		:param preload_workers: amount of processes converting files on preload. Use 0 for amount of CPUs.
+		:param convert_timeout: seconds to wait for conversion of the same file by another thread or process before converting it independently.
+		"""
+		self._version = 3
 		self.path = path
 		self.root = root
+		self.store = CacheStore(path)
+		self.index = SearchIndex(self.store)
+		"Search index of cached files updated on each save."
 		self.files: dict[str, CachedFile] = {}
+		self._lock = threading.RLock()
+		self._dirty: set[str] = set()
+		"Keys of entries converted but not written to store yet."
+		self._saving: set[str] = set()
+		"Keys of entries being written to store by save."
+		self.memory_limit = memory_limit
+		self._resident: OrderedDict[str, int] = OrderedDict()
+		"Memory taken by contents kept in memory by keys in order of usage (the last is the most recently used)."
+		self._resident_size = 0
+		self.hits = 0
+		"Amount of contents found in memory."
+		self.misses = 0
+		"Amount of contents read from persistent store or converted."
+		self.evictions = 0
+		"Amount of contents evicted from memory."
+		self.preload_workers = preload_workers
+		self.watcher: Watcher | None = None
+		self.watched = False
+		"Whether files are watched for changes so entries are not validated on access."
+		self._stale: set[str] = set()
+		"Keys of entries reported as changed by watcher and not reconverted yet."
+		self._queue: OrderedDict[str, Path] = OrderedDict()
+		"Files waiting for conversion by preload."
+		self.convert_timeout = convert_timeout
+		self._converting: dict[str, Future] = {}
+		"Conversions in progress by keys so concurrent misses of the same entry are converted once."
+		self._revalidating: dict[str, float] = {}
+		"Modification POSIX timestamps of changed files by keys of entries served stale while reconverted in background."
+		self._revalidator: ThreadPoolExecutor | None = None
+		self._warm = threading.Event()
+		self.generation = uuid4().hex
+		"Identifier of cache instance shared by forked processes to recognize warm up finished by any of them."
 		self.load()
-		self.purge()
 		if preload:
-			self.preload()
+			self.purge()
+			self.preload(workers=preload_workers)
+			self._warm.set()
 
 	def purge(self):
 		"""
 		Remove old files that do not exist anymore.
 		"""
-		old = len(self.files)
-		for f in list(self.files):
-			if not (self.root / f).is_file():
+		with self._lock:
+			removed = [f for f in self.files if not (self.root / f).is_file()]
+			for f in removed:
 				del self.files[f]
-		if len(self.files) != old:
-			self.save()
+				self._dirty.discard(f)
+				self._resident_size -= self._resident.pop(f, 0)
+		if removed:
+			self.store.delete(removed)
 
-	def preload(self):
+	def preload(self, workers: int = 1, report_interval: float = 5):
+		"""
+		Convert all new and changed files and save them in batches.
+
+		Files are queued and submitted to converting processes gradually so files requested meanwhile are removed from queue and converted immediately.
+
+		:param workers: amount of processes converting files in parallel. Use 0 for amount of CPUs or 1 to convert in current process.
+		:param report_interval: period in seconds of logging progress.
+		"""
 		logger.info('Preloading cache...')
-		old_files = set(self.files)
-		for entry in self.root.rglob('*'):
-			if entry.is_file() and not entry.name.startswith('.') and all([not parent.name.startswith('.') for parent in entry.parents]):
-				self.get_content(entry, save=False)
-		preloaded_files = set(self.files) - old_files
+		files = [entry for entry in self.root.rglob('*') if entry.is_file() and not entry.name.startswith('.') and all([not parent.name.startswith('.') for parent in entry.parents])]
+		# files may be hashed (e.g. after migration) so they are validated without lock blocking requests
+		queue = OrderedDict((key, f) for f in files if (cached := self.files.get(key := f.relative_to(self.root).to_url_format())) is None or cached.has_changed(f))
+		total = len(queue)
+		with self._lock:
+			self._queue = queue
+		started = reported = monotonic()
+		preloaded_files = []
+		workers = workers or os.cpu_count() or 1
+		with ThreadPoolExecutor(max_workers=1) if workers == 1 or total < 2 else ProcessPoolExecutor(max_workers=workers, mp_context=_process_context()) as executor:
+			converting: dict[Future, tuple[str, Path, CachedFile]] = {}
+			while True:
+				with self._lock:
+					submitted = [self._queue.popitem(last=False) for _ in range(min(len(self._queue), workers * 2 - len(converting)))]
+				for key, file in submitted:
+					# file is hashed before conversion so changes made meanwhile are not hidden by hashes of changed file
+					try:
+						cached = CachedFile.from_file(file, None)
+					except OSError as e:
+						logger.warning(f'Can not preload {file}: {e}')
+						continue
+					converting[executor.submit(get_content, file)] = (key, file, cached)
+				if not converting:
+					if submitted:
+						continue
+					break
+				done, _ = wait(converting, return_when=FIRST_COMPLETED)
+				for future in done:
+					key, file, cached = converting.pop(future)
+					try:
+						cached.content = future.result()
+					except Exception as e:
+						logger.warning(f'Can not preload {file}: {e}')
+						continue
+					with self._lock:
+						self.files[key] = cached
+						self._dirty.add(key)
+						self._touch(key, cached)
+					preloaded_files.append(key)
+				if monotonic() - reported >= report_interval:
+					reported = monotonic()
+					logger.info(f'Preloaded {len(preloaded_files)}/{total} files ({len(preloaded_files) / (reported - started):.1f} files/s).')
+					self.save()  # let other processes read converted files before warm up finishes
 		if len(preloaded_files):
-			logger.info(f'Preloaded {len(preloaded_files)} article pages from {", ".join(preloaded_files)}.')
+			elapsed = monotonic() - started
+			logger.info(f'Preloaded {len(preloaded_files)} article pages in {elapsed:.1f} s ({len(preloaded_files) / elapsed if elapsed else 0:.1f} files/s) from {", ".join(preloaded_files)}.')
 		self.save()
 
+	def warm_up(self, workers: int | None = None, watch: bool = False, watch_interval: float = 2):
+		"""
+		Purge and preload cache, then mark it warm. Intended to run in background while server already serves requests.
+
+		:param workers: amount of processes converting files. Default is defined on cache creation.
+		:param watch: whether to watch cached files for changes and reconvert them in background. Entries are not validated on access after warm up in this case.
+		:param watch_interval: seconds between directory scans in case inotify is not available.
+		"""
+		if watch:
+			# start watching before preload so changes made meanwhile are not missed
+			self.watcher = watch_directory(self.root, self.invalidate, interval=watch_interval)
+		try:
+			self.purge()
+			self.preload(workers=self.preload_workers if workers is None else workers)
+		except Exception as e:
+			logger.error(f'Cache warm up failed: {e}')
+			logger.exception(e)
+		finally:
+			self.watched = self.watcher is not None
+			self.store.set_meta('warm', self.generation)
+			self._warm.set()
+			logger.info('Cache is warm.')
+
+	@property
+	def is_warm(self) -> bool:
+		"""
+		Whether warm up has finished in this or another process sharing persistent store.
+		"""
+		if not self._warm.is_set() and self.store.get_meta('warm') == self.generation:
+			# entries converted by warm up process are not known yet
+			with self._lock:
+				for key, data in self.store.metadata().items():
+					if key not in self.files:
+						self.files[key] = CachedFile(**data, content=None, loaded=False)
+			self._warm.set()
+		return self._warm.is_set()
+
 	def get_content(self, file: Path, save: bool = True) -> str | None:
+		return self.get_entry(file, save=save).content
+
+	def get_entry(self, file: Path, save: bool = True, load: bool = True) -> CachedFile:
+		"""
+		Get up to date cached file converting it if necessary.
+
+		:param save: whether to write other converted entries (e.g. by preload) to persistent store immediately. Converted entry itself is always written immediately so other processes can use it.
+		:param load: whether to read content of lazily loaded entry from persistent store.
+		"""
 		if not file.is_relative_to(self.root):
 			raise ValueError(f'Requested file {file} is outside of cache folder.')
 		key = file.relative_to(self.root).to_url_format()
-		if key not in self.files or self.files[key].has_changed(file):
-			self.files[key] = CachedFile.from_file(file, get_content(file))
+		with self._lock:
+			cached = self.files.get(key)
+			# requested file jumps preload queue
+			self._queue.pop(key, None)
+		# entries already reconverted in background are not validated again meanwhile
+		stale = cached is None or key not in self._revalidating and (key in self._stale if self.watched else cached.has_changed(file))
+		if stale and cached is not None and file.suffix in stale_while_revalidate:
+			# previous content is served until fresh one is swapped in by background conversion
+			self._revalidate(key, file)
+			stale = False
+		if stale:
+			cached = self._refresh(key, file)
 			if save:
 				self.save()
-		return self.files[key].content
+		elif load and not cached.loaded:
+			self._load_content(key, cached)
+		elif load:
+			with self._lock:
+				self.hits += 1
+				self._touch(key, cached)
+		return cached
+
+	def stale_age(self, file: Path) -> float | None:
+		"""
+		Seconds since cached file has changed in case its previous content is served while it is reconverted in background, otherwise None.
+		"""
+		with self._lock:
+			changed = self._revalidating.get(file.relative_to(self.root).to_url_format()) if file.is_relative_to(self.root) else None
+		return max(0.0, time() - changed) if changed is not None else None
+
+	def _refresh(self, key: str, file: Path) -> CachedFile:
+		"""
+		Convert file (or read entry converted by another process) and replace cached entry with it.
+		"""
+		cached = self._convert(key, file)
+		with self._lock:
+			self.misses += 1
+			self._stale.discard(key)
+			self._revalidating.pop(key, None)
+			self.files[key] = cached
+			self._touch(key, cached)
+		return cached
+
+	def _revalidate(self, key: str, file: Path):
+		"""
+		Schedule background conversion of changed file unless it is scheduled already.
+		"""
+		try:
+			changed = file.stat().st_mtime
+		except OSError:
+			changed = time()
+		with self._lock:
+			if key in self._revalidating:
+				return
+			self._revalidating[key] = changed
+			if self._revalidator is None:
+				self._revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix='wiki-revalidate')
+			self._revalidator.submit(self._revalidate_now, key, file)
+
+	def _revalidate_now(self, key: str, file: Path):
+		try:
+			self._refresh(key, file)
+			self.save()
+			logger.info(f'Reconverted {key} in background.')
+		except Exception as e:
+			logger.warning(f'Can not reconvert {file} in background: {e}')
+		finally:
+			with self._lock:
+				self._revalidating.pop(key, None)
+
+	def invalidate(self, paths: set[Path]):
+		"""
+		Drop entries of deleted files and reconvert changed or created files. Intended to be called by watcher.
+
+		:param paths: changed, created or deleted files and directories.
+		"""
+		changed = []
+		with self._lock:
+			for path in paths:
+				key = path.relative_to(self.root).to_url_format() if path != self.root else ''
+				affected = [k for k in self.files if not key or k == key or k.startswith(f'{key}/')]
+				if path.is_file():
+					affected.append(key)
+				elif path.is_dir():
+					affected += [f.relative_to(self.root).to_url_format() for f in path.rglob('*') if f.is_file()]
+				for k in affected:
+					self._stale.add(k)
+					self._queue.pop(k, None)
+				changed += affected
+			created = [key for key in dict.fromkeys(changed) if key not in self.files]
+		if created := [key for key in created if (self.root / key).is_file()]:
+			changed += self._relink()
+		removed = []
+		for key in dict.fromkeys(changed):
+			file = self.root / key
+			if not file.is_file():
+				with self._lock:
+					if key in self.files:
+						del self.files[key]
+						removed.append(key)
+					self._stale.discard(key)
+					self._dirty.discard(key)
+					self._resident_size -= self._resident.pop(key, 0)
+				continue
+			if key not in self._stale:
+				continue  # already reconverted on request
+			try:
+				self.get_entry(file, save=False, load=False)
+			except Exception as e:
+				logger.warning(f'Can not reconvert {file}: {e}')
+		if removed:
+			self.store.delete(removed)
+			logger.info(f'Removed {", ".join(removed)} from cache.')
+		self.save()
+
+	def _relink(self) -> list[str]:
+		"""
+		Expire entries with internal links not resolved on conversion that resolve to existing files now, so they are reconverted with links to these files.
+
+		:return: keys of expired entries.
+		"""
+		page_index.clear()
+		expired = list(dict.fromkeys(source for source, label, target in self.store.broken_links() if not target and page_index.resolve(label) is not None))
+		if not expired:
+			return []
+		self.store.expire(expired)
+		with self._lock:
+			for key in expired:
+				if (entry := self.files.get(key)) is not None:
+					self.files[key] = dataclasses.replace(entry, md5=None, sha1=None, size=None, mtime_ns=None, inode=None)
+				self._stale.add(key)
+				self._queue.pop(key, None)
+		logger.info(f'Reconverting {", ".join(expired)} with links to created files.')
+		return expired
+
+	def backlinks(self, key: str) -> list[str]:
+		"""
+		Keys of entries linking to entry including links not resolved on conversion that resolve to it now.
+
+		Only unresolved links with labels matching beginning of file name are resolved again.
+		"""
+		sources = set(self.store.backlinks(key))
+		sources.update(source for source, label in self.store.unresolved_links(Path(key).name) if source != key and page_index.resolve(label) == key)
+		return sorted(sources)
+
+	def broken_links(self) -> list[tuple[str, str, str]]:
+		"""
+		Internal links to files that are not found or not cached anymore: source key, label and target key (empty if not resolved).
+
+		Links not resolved on conversion are resolved again so links to files created after conversion of source are not reported.
+		"""
+		return [(source, label, target) for source, label, target in self.store.broken_links() if target or page_index.resolve(label) is None]
+
+	def _convert(self, key: str, file: Path) -> CachedFile:
+		"""
+		Convert file once for all threads and processes missing the same entry at the same time.
+
+		The first thread converts file holding lock file of entry while the other threads wait for its result and the other processes wait for lock file and read converted entry from persistent store. Waiting longer than convert_timeout converts file independently.
+		"""
+		with self._lock:
+			future = self._converting.get(key)
+			if owner := future is None:
+				future = self._converting[key] = Future()
+		if not owner:
+			try:
+				return future.result(timeout=self.convert_timeout)
+			except TimeoutError:
+				logger.warning(f'Conversion of {file} takes more than {self.convert_timeout} seconds, converting it independently.')
+				return self._convert_file(key, file)
+		try:
+			with self._file_lock(key):
+				future.set_result(self._convert_file(key, file))
+		except BaseException as e:
+			future.set_exception(e)
+		finally:
+			with self._lock:
+				del self._converting[key]
+		return future.result()
+
+	def _convert_file(self, key: str, file: Path) -> CachedFile:
+		# entry may be already converted by another process
+		if (cached := self._load_stored(key)) is not None and not cached.has_changed(file):
+			return cached
+		# convert outside of lock so slow converters do not block other threads, file is hashed first so changes made meanwhile are detected later
+		cached = CachedFile.from_file(file, None)
+		cached.content = get_content(file)
+		data = cached.serialize()
+		self.store.put([(key, data)], [make_document(key, data['content'])])
+		with self._lock:
+			self._dirty.discard(key)
+		return cached
+
+	@contextmanager
+	def _file_lock(self, key: str) -> Iterator[None]:
+		"""
+		Hold exclusive lock of entry shared by processes. Lock is given up after convert_timeout seconds of waiting.
+
+		Entries share fixed set of lock files by hash of key so lock files do not pile up. Entries sharing lock file are converted one by one.
+		"""
+		if fcntl is None:
+			yield
+			return
+		directory = self.path.with_name(f'{self.path.name}.locks')
+		directory.mkdir(exist_ok=True)
+		with open(directory / f'{int(md5(key.encode("utf-8")).hexdigest(), 16) % _LOCK_STRIPES}.lock', 'wb') as f:
+			deadline = monotonic() + self.convert_timeout
+			while not (locked := self._try_lock(f)) and monotonic() < deadline:
+				sleep(0.05)
+			if not locked:
+				logger.warning(f'Conversion of {key} by another process takes more than {self.convert_timeout} seconds, converting it independently.')
+			try:
+				yield
+			finally:
+				if locked:
+					fcntl.flock(f, fcntl.LOCK_UN)
+
+	@staticmethod
+	def _try_lock(f) -> bool:
+		try:
+			fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+			return True
+		except BlockingIOError:
+			return False
+
+	def _load_stored(self, key: str) -> CachedFile | None:
+		"""
+		Read entry with content from persistent store.
+		"""
+		if (data := self.store.get(key)) is None:
+			return
+		return CachedFile.deserialize(data)
+
+	def _load_content(self, key: str, cached: CachedFile):
+		"""
+		Read content of entry loaded lazily or evicted.
+		"""
+		content = self.store.content(key)
+		with self._lock:
+			cached.content = content
+			cached.loaded = True
+			self.misses += 1
+			self._touch(key, cached)
+
+	def _touch(self, key: str, cached: CachedFile):
+		"""
+		Mark content as the most recently used, account memory taken by it and evict the least recently used contents exceeding memory limit.
+
+		Must be called under lock.
+		"""
+		self._resident_size += (size := cached.memory_size()) - self._resident.pop(key, 0)
+		self._resident[key] = size
+		self._evict()
+
+	def _evict(self):
+		"""
+		Evict the least recently used contents exceeding memory limit. Contents not written to store yet are kept until they are saved.
+
+		Must be called under lock.
+		"""
+		if not self.memory_limit or self._resident_size <= self.memory_limit:
+			return
+		# the most recently used content is never evicted
+		for evicted in list(self._resident)[:-1]:
+			if self._resident_size <= self.memory_limit:
+				break
+			if evicted in self._dirty or evicted in self._saving:
+				continue  # evicted contents must be readable from store
+			self._resident_size -= self._resident.pop(evicted)
+			if (entry := self.files.get(evicted)) is not None:
+				# replace entry instead of changing it so threads holding evicted entry still can read its content
+				self.files[evicted] = dataclasses.replace(entry, content=None, loaded=False)
+				self.evictions += 1
+
+	def stats(self) -> dict[str, int]:
+		"""
+		Counters of contents kept in memory.
+		"""
+		with self._lock:
+			return {
+				'entries'   : len(self.files),
+				'resident'  : len(self._resident),
+				'memory'    : self._resident_size,
+				'hits'      : self.hits,
+				'misses'    : self.misses,
+				'evictions' : self.evictions,
+				'queued'    : len(self._queue),
+			}
 
 	def __getitem__(self, file: Path) -> str | None:
 		return self.get_content(file=file)
 
-	def serialize(self) -> dict[str, int | dict[str, dict[str, str]]]:
-		return {
-			'version': self._version,
-			'files'  : {p: f.serialize() for p, f in self.files.items()}
-		}
-
 	def deserialize(self, data: dict[str, ...]):
-		self._version = data['version']
+		"""
+		Import legacy pickled cache (versions 1 and 2).
+		"""
+		# version 1 entries have no file metadata and are validated by hashes once
+		logger.info(f'Migrating cache from version {data["version"]} to {self._version}.')
 		self.files = {p: CachedFile.deserialize(f) for p, f in data['files'].items()}
+		self._dirty = set(self.files)
 
 	def save(self):
-		self.path.write_bytes(pickle.dumps(self.serialize()))
+		"""
+		Write converted entries and their search documents to persistent store.
+		"""
+		with self._lock:
+			dirty = [(key, self.files[key].serialize()) for key in self._dirty if key in self.files]
+			self._saving.update(key for key, _ in dirty)
+			self._dirty.clear()
+		if not dirty:
+			return
+		try:
+			self.store.put(dirty, [make_document(key, data['content']) for key, data in dirty])
+		except BaseException:
+			with self._lock:
+				self._dirty.update(key for key, _ in dirty)
+			raise
+		finally:
+			with self._lock:
+				self._saving.difference_update(key for key, _ in dirty)
+				# contents kept until they were written can be evicted now
+				self._evict()
 
 	def load(self):
-		if self.path.exists():
-			self.deserialize(pickle.loads(self.path.read_bytes()))
+		"""
+		Read entries metadata from persistent store. Contents are read on demand.
+		"""
+		empty = False
+		if self.store.version is None:
+			if (legacy := self.path.with_suffix('.pkl')).exists():
+				self.deserialize(pickle.loads(legacy.read_bytes()))
+				self.save()
+			else:
+				empty = True
+			self.store.version = self._version
+		# contents converted by other converters (or stored in other format of search documents, e.g. without internal links) are outdated
+		converters, documents = converters_fingerprint(), str(DOCUMENTS_VERSION)
+		if (self.store.get_meta('converters'), self.store.get_meta('documents')) != (converters, documents):
+			if not empty:
+				logger.info('Converters or search documents format have changed, cached files will be reconverted.')
+				self.store.expire()
+			self.store.set_meta('converters', converters)
+			self.store.set_meta('documents', documents)
+		# entries stored before search index existed
+		if unindexed := self.store.unindexed():
+			self.store.put((), [make_document(path, content) for path, content in unindexed])
+		# lock files of previous versions were created per entry
+		if (locks := self.path.with_name(f'{self.path.name}.locks')).is_dir():
+			for lock in locks.glob('*.lock'):
+				if len(lock.stem) == 32:
+					lock.unlink(missing_ok=True)
+		self.files = {p: CachedFile(**f, content=None, loaded=False) for p, f in self.store.metadata().items()}
+		self._resident.clear()
+		self._resident_size = 0
 
 	def __del__(self):
 		# self.save()
 		pass
 
 
-cache = Cache(Path.cwd() / 'cache.pkl', root=Path('wiki'))
+cache = Cache(Path.cwd() / 'cache.sqlite', root=Path('wiki'), preload=False, memory_limit=settings.get('cache_memory_limit', 0), preload_workers=settings.get('preload_workers', 0), convert_timeout=settings.get('convert_timeout', 120))
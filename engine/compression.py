@@ -0,0 +1,82 @@
+"""Compression of responses bodies and precompressed resources."""
+import gzip
+import os
+import tempfile
+from typing import Callable
+
+from engine.logging import logger
+from engine.path import Path
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+encoders: dict[str, Callable[[bytes], bytes]] = {'gzip': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+"Compression functions by content coding name in order of preference (the last is the most preferred)."
+if brotli is not None:
+	encoders['br'] = lambda data: brotli.compress(data, quality=11)
+
+suffixes = {'gzip': '.gz', 'br': '.br'}
+"File name suffixes of precompressed files by content coding name."
+
+_COMPRESSIBLE_MIMES = ('application/javascript', 'application/json', 'application/xml', 'image/svg+xml', 'image/vnd.microsoft.icon', 'text/javascript')
+
+
+def is_compressible(mime: str | None) -> bool:
+	"""
+	Whether content of defined mime type is worth compressing. Already compressed formats (images, woff fonts, archives) are not.
+	"""
+	return mime is not None and (mime.startswith('text/') or mime in _COMPRESSIBLE_MIMES)
+
+
+def encoded_etag(etag: str | None, encoding: str | None) -> str | None:
+	"""
+	Make entity tag of compressed representation from quoted entity tag of original one.
+	"""
+	if etag is None or encoding is None:
+		return etag
+	return f'{etag[:-1]}-{encoding}"'
+
+
+def precompressed(file: Path, encoding: str) -> Path | None:
+	"""
+	Get up to date precompressed sibling of file (e.g. style.css.gz for style.css), building it if necessary.
+
+	Sibling is considered up to date while its modification time equals the one of original file.
+
+	:return: path to sibling or None in case it can not be built.
+	"""
+	if encoding not in encoders or file.name.endswith(tuple(suffixes.values())):
+		return
+	sibling = file.with_name(file.name + suffixes[encoding])
+	stat = file.stat()
+	try:
+		if not sibling.is_file() or sibling.stat().st_mtime_ns != stat.st_mtime_ns:
+			# unique temporary file so concurrent builders (threads or processes) never write the same file
+			fd, tmp = tempfile.mkstemp(dir=sibling.parent, prefix=f'{sibling.name}.', suffix='.tmp')
+			try:
+				with os.fdopen(fd, 'wb') as f:
+					f.write(encoders[encoding](file.read_bytes()))
+				os.utime(tmp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+				os.replace(tmp, sibling)
+			except BaseException:
+				os.unlink(tmp)
+				raise
+	except OSError as e:
+		logger.warning(f'Can not precompress {file}: {e}')
+		return
+	return sibling
+
+
+def precompress(directory: Path) -> int:
+	"""
+	Build precompressed siblings of all compressible files in directory recursively.
+
+	:return: amount of files considered.
+	"""
+	files = [f for f in directory.rglob('*') if f.is_file() and not f.name.endswith(tuple(suffixes.values())) and is_compressible(f.guess_mime())]
+	for file in files:
+		for encoding in encoders:
+			precompressed(file, encoding)
+	return len(files)
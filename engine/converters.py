@@ -1,14 +1,20 @@
 import importlib
 import importlib.util
 from collections import defaultdict
+from hashlib import sha1
 from importlib.machinery import ModuleSpec
 from types import ModuleType
 from typing import Callable
 
 from engine.path import Path
+from engine.settings import settings
 
 processors: dict[str, Callable[[Path], str | None]] = defaultdict(lambda: lambda *_, **__: None)
 post_processors: list[Callable[[str], str]] = []
+stale_while_revalidate: set[str] = set()
+"Extensions of files which previous content is served while they are reconverted in background."
+conversion_settings: set[str] = set()
+"Names of settings affecting converted markup, e.g. options of converters."
 
 
 class ConvertionError(RuntimeError):
@@ -19,7 +25,7 @@ class PostProcessingError(ConvertionError):
 	pass
 
 
-def converter(*extensions: str) -> Callable[[Callable[[Path], str | None]], Callable[[Path], str | None]]:
+def converter(*extensions: str, revalidate_in_background: bool = False) -> Callable[[Callable[[Path], str | None]], Callable[[Path], str | None]]:
 	"""
 	Converter function decorator.
 
@@ -28,11 +34,16 @@ def converter(*extensions: str) -> Callable[[Callable[[Path], str | None]], Call
 	If converter/extension has been already defined overrides it.
 
 	:param extension: file extension with dot, e.g. '.docx', which can be processed with this converter.
+	:param revalidate_in_background: whether to serve previous content of changed file while it is reconverted in background, e.g. for slow converters.
 	"""
 
 	def decorator(processor: Callable[[Path], str | None]) -> Callable[[Path], str | None]:
 		for extension in extensions:
 			processors[extension] = processor
+			if revalidate_in_background:
+				stale_while_revalidate.add(extension)
+			else:
+				stale_while_revalidate.discard(extension)
 		return processor
 
 	return decorator
@@ -97,3 +108,15 @@ def get_content(file: Path) -> str | None:
 
 _converters = load_converters()
 "Dynamically preloaded modules (*.py files) from ./converters/ directory."
+
+
+def fingerprint() -> str:
+	"""
+	Fingerprint of loaded converters: their sources and settings affecting converted markup. Contents converted with another fingerprint are outdated.
+	"""
+	digest = sha1()
+	for module in _converters.values():
+		digest.update(Path(module.__file__).read_bytes())
+	for name in sorted(conversion_settings):
+		digest.update(f'{name}={settings.get(name)!r};'.encode('utf-8'))
+	return digest.hexdigest()
@@ -1,8 +1,13 @@
+import json
 from typing import Callable, Dict, Type
 
-from engine.pages import FilePage, IPage, SearchPage, SectionPage
-from engine.requests import IRequest, PageRequest, RedirectedRequest, ResourceRequest, RootRequest, SearchRequest, SectionRequest
-from engine.responses import DataResponse, FileResponse, RedirectResponse, Response, ServerErrorReponse
+from engine.cache import cache
+from engine.compression import encoded_etag, is_compressible, precompressed
+from engine.pandoc import pandoc
+from engine.pages import BrokenLinksPage, FilePage, IPage, SearchPage, SectionPage
+from engine.rendering import rendered
+from engine.requests import BrokenLinksRequest, HealthRequest, IRequest, PageRequest, RedirectedRequest, ResourceRequest, RootRequest, SearchRequest, SectionRequest, SuggestRequest
+from engine.responses import DataResponse, FileResponse, is_not_modified, negotiate_encoding, NotFoundResponse, NotModifiedResponse, RedirectResponse, Response, ServerErrorReponse
 
 RequestHandler = Callable[[IRequest], Response]
 
@@ -12,11 +17,14 @@ class RequestTypeHandler(Dict[Type[IRequest], RequestHandler]):
 
 	def __init__(self, handlers: Dict[Type[IRequest], RequestHandler] = None):
 		defaults = {
-			RedirectedRequest: self._handle_redirect,
-			ResourceRequest:   self._handle_resource,
-			SearchRequest:     self._handle_search,
-			PageRequest:       self._handle_article,
-			SectionRequest:    self._handle_section,
+			RedirectedRequest:  self._handle_redirect,
+			ResourceRequest:    self._handle_resource,
+			SearchRequest:      self._handle_search,
+			PageRequest:        self._handle_article,
+			SectionRequest:     self._handle_section,
+			HealthRequest:      self._handle_health,
+			SuggestRequest:     self._handle_suggest,
+			BrokenLinksRequest: self._handle_broken_links,
 		}
 		if handlers:
 			defaults.update(handlers)
@@ -31,8 +39,45 @@ class RequestTypeHandler(Dict[Type[IRequest], RequestHandler]):
 	def _handle_redirect(self, request: RedirectedRequest) -> RedirectResponse:
 		return RedirectResponse(request.url)
 
-	def _handle_resource(self, request: ResourceRequest) -> FileResponse:
-		return FileResponse(request.path)
+	def _handle_health(self, request: HealthRequest) -> DataResponse | NotFoundResponse:
+		"""
+		Report server state as JSON. /health/ answers while server is up, /health/warm answers with 503 until cache is warm.
+		"""
+		if request.check not in ('', 'warm'):
+			return NotFoundResponse()
+		warm = cache.is_warm
+		response = DataResponse(json.dumps({'status': 'warm' if warm else 'warming', 'cache': cache.stats(), 'rendered': rendered.stats(), 'search': cache.index.stats(), 'pandoc': pandoc.stats()}).encode('utf-8'), 'application/json')
+		if request.check == 'warm' and not warm:
+			response.code, response.text = 503, 'Service Unavailable'
+		response.headers['Cache-Control'] = 'no-store'
+		return response
+
+	def _handle_suggest(self, request: SuggestRequest) -> DataResponse:
+		"""
+		Complete search query by names of pages and sections and headings as JSON list.
+		"""
+		limit = request.parameters.get('limit', '')
+		suggestions = cache.index.suggest(request.prefix, min(int(limit), 50) if limit.isdigit() else 10) if request.prefix else []
+		response = DataResponse(json.dumps(suggestions, ensure_ascii=False).encode('utf-8'), 'application/json')
+		response.headers['Cache-Control'] = 'no-cache'
+		return response
+
+	def _handle_resource(self, request: ResourceRequest) -> FileResponse | NotModifiedResponse:
+		stat = request.path.stat()
+		mime = request.path.guess_mime()
+		file = request.path
+		if is_compressible(mime) and (encoding := negotiate_encoding(request.headers.get('accept-encoding', ''))) and (compressed := precompressed(file, encoding)):
+			file = compressed
+		else:
+			encoding = None
+		etag = encoded_etag(f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"', encoding)
+		response = NotModifiedResponse(etag, stat.st_mtime) if is_not_modified(request.headers, etag, stat.st_mtime) else FileResponse(file, mime)
+		response.set_validators(etag, stat.st_mtime)
+		if is_compressible(mime):
+			response.set_encoding(encoding)
+		if isinstance(response, FileResponse):
+			return response.select_ranges(request.headers)
+		return response
 
 	def _handle_page(self, request: RootRequest, t_page: Type[IPage]) -> DataResponse:
 		return t_page(request).render()
@@ -46,5 +91,8 @@ class RequestTypeHandler(Dict[Type[IRequest], RequestHandler]):
 	def _handle_section(self, request: SectionRequest) -> DataResponse:
 		return self._handle_page(request, SectionPage)
 
+	def _handle_broken_links(self, request: BrokenLinksRequest) -> DataResponse:
+		return self._handle_page(request, BrokenLinksPage)
+
 
 handle_request_by_type = RequestTypeHandler()
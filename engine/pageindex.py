@@ -0,0 +1,118 @@
+"""Index of wiki files for resolution of internal links by name."""
+import glob
+import os
+import re
+import threading
+from bisect import bisect_left
+from time import monotonic
+
+from engine.path import Path
+
+
+def split_label(label: str) -> tuple[str, str]:
+	"""
+	Split label of internal link into linked name (relative path or its beginning) and anchor, e.g. "Simple Wiki / Markdown # Lists" into "Simple Wiki/Markdown" and "#Lists".
+	"""
+	label = re.sub(r'\s*/\s*', '/', label)
+	if (match := re.search(r'\s*#.*', label)) is None:
+		return label, ''
+	return label[:match.start(0)], re.sub(r'\s*#\s*', '#', match.group())
+
+
+class PageIndex:
+	"""
+	Listings of wiki directories for resolution of internal links without walking the whole wiki.
+
+	Resolution is the same as the first (the least) match of Path.rglob(f'{label}*') in wiki directory. Listings are read once and are validated by modification time of directory, i.e. one stat per visited directory at most once per max_age.
+	"""
+
+	def __init__(self, root: Path, max_age: float = 1):
+		"""
+		:param root: wiki directory.
+		:param max_age: seconds during which listing is used without validation, e.g. for all links of converted page.
+		"""
+		self.root = root
+		self.max_age = max_age
+		self._listings: dict[str, tuple[float, int, list[str], set[str]]] = {}
+		"Time of validation, modification time, sorted entry names and names of subdirectories by directory."
+		self._lock = threading.Lock()
+
+	def _listing(self, directory: Path) -> tuple[list[str], set[str]] | None:
+		with self._lock:
+			cached = self._listings.get(key := str(directory))
+		if cached is not None and monotonic() - cached[0] < self.max_age:
+			return cached[2], cached[3]
+		try:
+			modified = os.stat(directory).st_mtime_ns
+		except OSError:
+			return
+		if cached is None or cached[1] != modified:
+			try:
+				with os.scandir(directory) as entries:
+					entries = list(entries)
+			except OSError:
+				return
+			cached = (0, modified, sorted(entry.name for entry in entries), {entry.name for entry in entries if entry.is_dir()})
+		cached = (monotonic(), *cached[1:])
+		with self._lock:
+			self._listings[key] = cached
+		return cached[2], cached[3]
+
+	def _matches(self, directory: Path, parts: list[str]) -> list[Path]:
+		"""
+		The same entries as Path.rglob(f'{"/".join(parts)}*') of directory yields but not sorted.
+		"""
+		for part in parts[:-1]:
+			if (listing := self._listing(directory)) is None or part not in listing[1]:
+				return []
+			directory = directory / part
+		if (listing := self._listing(directory)) is None:
+			return []
+		names, directories = listing
+		found = []
+		prefix = parts[-1]
+		index = bisect_left(names, prefix)
+		while index < len(names) and (name := names[index]).startswith(prefix):
+			index += 1
+			if name.startswith('.'):
+				continue
+			if name in directories:
+				found += self._matches(directory / name, parts)
+			else:
+				found.append(directory / name)
+		return found
+
+	def find(self, label: str) -> Path | None:
+		"""
+		Find file linked by label.
+
+		:param label: relative path or its beginning, e.g. "Simple Wiki/Markdown".
+		:return: path to the first matched file or None.
+		"""
+		parts = label.split('/')
+		if any(not part or part in ('.', '..') or glob.has_magic(part) for part in parts):
+			# rare labels with glob patterns are resolved as is
+			return next(iter(self.root.rglob(f'{label}*')), None)
+		found = self._matches(self.root, parts)
+		return min(found, key=lambda path: path.parts) if found else None
+
+	def resolve(self, label: str) -> str | None:
+		"""
+		Find file linked by label of internal link.
+
+		:param label: label of link, e.g. "Simple Wiki/Markdown#Lists".
+		:return: path of linked file relative to wiki directory or None.
+		"""
+		found = self.find(split_label(label)[0])
+		return found.relative_to(self.root).to_url_format() if found is not None else None
+
+	def clear(self):
+		"""
+		Forget listings so changes of files are seen immediately.
+		"""
+		with self._lock:
+			self._listings.clear()
+
+
+page_index = PageIndex(Path.cwd() / 'wiki')
+"Index of wiki directory shared by converters."
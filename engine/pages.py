@@ -1,18 +1,27 @@
 import random
+import re
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import auto, Enum
+from functools import cached_property
+from hashlib import sha1
 from typing import Self
 
-from engine.cache import cache
+from engine.cache import cache, CachedFile
+from engine.compression import encoded_etag, encoders
 from engine.converters import get_content
 from engine.path import Path
-from engine.rendering import render
-from engine.requests import PageRequest, RootRequest, SearchRequest, SectionRequest
-from engine.responses import DataResponse, FileResponse, Response
+from engine.rendering import fingerprint, render, rendered
+from engine.requests import BrokenLinksRequest, PageRequest, RootRequest, SearchRequest, SectionRequest
+from engine.responses import DataResponse, FileResponse, is_not_modified, negotiate_encoding, NotModifiedResponse, Response
+from engine.search import make_snippet
 from engine.settings import settings
 
 
+_UNHIGHLIGHTED_CODE = re.compile(r'<code(?! class="lang-mermaid")[\s>]')
+_UNHIGHLIGHTED_BLOCK = re.compile(r'<pre><code(?! class="lang-mermaid")[\s>]')
+
+
 class LinkType(Enum):
 	Article = auto()
 	Section = auto()
@@ -50,13 +59,86 @@ class IPage(ABC):
 
 	def __init__(self, request: RootRequest):
 		self.request = request
+		self.deterministic = True
+		"Whether rendered markup depends only on its inputs, i.e. sidebar links are not sampled randomly."
+
+	def render(self) -> Response:
+		"""Generate response from page content. Conditional requests are answered without rendering and pages rendered from the same dependencies are not rendered again."""
+		etag, last_modified = self.validators()
+		encoding = self._negotiate_encoding()
+		encoded = encoded_etag(etag, encoding)
+		if is_not_modified(self.request.headers, encoded, last_modified):
+			response = NotModifiedResponse(encoded, last_modified)
+		elif isinstance(data := self._rendered(etag, encoding), Response):
+			response = data
+		else:
+			response = DataResponse(data, 'text/html')
+		if not isinstance(response, FileResponse):
+			response.set_encoding(encoding)
+		if encoded:
+			response.set_validators(encoded, last_modified)
+			response.headers['Cache-Control'] = 'no-cache'
+		if isinstance(response, FileResponse):
+			return response.select_ranges(self.request.headers)
+		return response
+
+	def validators(self) -> tuple[str | None, float | None]:
+		"""Return ETag and last modification timestamp of rendered page or Nones in case page can not be validated."""
+		return None, None
+
+	def _negotiate_encoding(self) -> str | None:
+		"""Choose content coding of rendered page by Accept-Encoding of request."""
+		return negotiate_encoding(self.request.headers.get('accept-encoding', ''))
+
+	def _rendered(self, etag: str | None, encoding: str | None) -> bytes | Response:
+		"""
+		Get rendered (and compressed) page from rendered pages cache or render it.
 
-	def render(self) -> DataResponse:
-		"""Generate response from page content."""
-		content = self._render_markup()
-		if isinstance(content, Response):
-			return content
-		return DataResponse(content.encode('utf-8'), 'text/html')
+		Entity tag is used as dependency key so pages that can not be validated are never cached.
+		"""
+		name = f'page:{self.current_path}'
+		markup = None
+		if etag is not None:
+			if (data := rendered.get(name, etag, encoding or '')) is not None:
+				return data
+			if encoding:
+				markup = rendered.get(name, etag)
+		if markup is None:
+			if isinstance(content := self._render_markup(), Response):
+				return content
+			markup = content.encode('utf-8')
+			if etag is None or not self.deterministic:
+				return encoders[encoding](markup) if encoding else markup
+			rendered.put(name, etag, markup)
+		if not encoding:
+			return markup
+		data = encoders[encoding](markup)
+		rendered.put(name, etag, data, encoding)
+		return data
+
+	def _layout_fingerprint(self) -> tuple[str, float]:
+		"""Fingerprint of everything rendered around page content: templates, config, logo and directories listed in sidebar."""
+		return self._layout
+
+	@cached_property
+	def _layout(self) -> tuple[str, float]:
+		# directories above wiki (e.g. application directory) are not listed in sidebar
+		parents = [section for section in [self.current_path.parent, self.current_path.parent.parent] if section.is_relative_to(self.request.root)]
+		digest, last_modified = fingerprint(Path('resources') / settings["logo"], self._sidebar_section(), *parents)
+		if self.backlinks or self.linked:
+			# links of page change without change of its file when linked files are created
+			digest = sha1('\n'.join([digest, *self.backlinks, '', *self.linked]).encode('utf-8')).hexdigest()
+		return digest, last_modified
+
+	@property
+	def backlinks(self) -> list[str]:
+		"""Paths of files linking to the page relative to wiki directory."""
+		return []
+
+	@property
+	def linked(self) -> list[str]:
+		"""Paths of files linked by the page relative to wiki directory (empty for broken links)."""
+		return []
 
 	@property
 	@abstractmethod
@@ -78,10 +160,26 @@ class IPage(ABC):
 		logo_path = Path('resources') / settings["logo"]
 		if logo_path.exists() and logo_path.is_file():
 			logo = logo_path.read_text(encoding='utf-8')
-		return render('page.html', content=content, sidebar=self._render_sidebar(), icon=settings["icon"], logo=logo)
+		# code which is not highlighted on conversion is highlighted in browser
+		browser_code = _UNHIGHLIGHTED_BLOCK if settings.get('server_highlighting', False) else _UNHIGHLIGHTED_CODE
+		return render('page.html', content=content, sidebar=self._render_sidebar(), icon=settings["icon"], logo=logo, highlight_js=browser_code.search(content) is not None, highlighted='<div class="highlight">' in content)
+
+	def _sidebar_section(self) -> Path:
+		return self.current_path.parent if isinstance(self.request, PageRequest) else self.current_path
 
 	def _render_sidebar(self) -> str:
-		current_section = self.current_path.parent if isinstance(self.request, PageRequest) else self.current_path
+		"""Render sidebar or get it from rendered pages cache while directories listed in it are the same."""
+		name = f'sidebar:{self.current_path}'
+		key, _ = self._layout_fingerprint()
+		if (markup := rendered.get(name, key)) is not None:
+			return markup.decode('utf-8')
+		markup = self._render_sidebar_markup()
+		if self.deterministic:
+			rendered.put(name, key, markup.encode('utf-8'))
+		return markup
+
+	def _render_sidebar_markup(self) -> str:
+		current_section = self._sidebar_section()
 		main_links = [Link(name='Заглавная страница', url='/wiki/', type=LinkType.Section)]
 		# get top level sections
 		if not self.request.root.is_the_same(self.current_path):
@@ -90,7 +188,9 @@ class IPage(ABC):
 					main_links.append(Link.from_path(section, LinkType.Section, self.request.root))
 		siblings = [Link.from_path(f, LinkType.Article, self.request.root) for f in current_section.glob('*') if f.is_file() and not self.current_path.is_the_same(f)]
 		subsections = [Link.from_path(f, LinkType.Section, self.request.root) for f in current_section.glob('*') if f.is_dir() and not self.current_path.is_the_same(f)]
-		return self._render_side_block(main_links, sort=False) + self._render_side_block(siblings, 'Статьи в разделе') + self._render_side_block(subsections, 'Подразделы')
+		# links to deleted files may stay in link graph until linking pages are converted again
+		backlinks = [Link.from_path(f, LinkType.Article, self.request.root) for f in [cache.root / p for p in self.backlinks] if f.is_file()]
+		return self._render_side_block(main_links, sort=False) + self._render_side_block(siblings, 'Статьи в разделе') + self._render_side_block(subsections, 'Подразделы') + self._render_side_block(backlinks, 'Ссылки на статью')
 
 	def _render_side_block(self, links: list[Link], label: str = '', *, sort: bool = True, maximum: int = 10) -> str:
 		"""
@@ -99,12 +199,16 @@ class IPage(ABC):
 		:param label: label of block.
 		:param links: list of Links. Returns empty string in case of empty list.
 		:param sort: whether to sort links by name (label).
-		:param maximum: maximum amount of links to render. Chooses random sample in case of overflow.
+		:param maximum: maximum amount of links to render. Chooses random sample in case of overflow. Sample is the same for the same page and links unless sidebar_sampling setting is "random".
 		"""
 		if not len(links):
 			return ''
 		if len(links) > maximum:
-			links = random.sample(links, maximum)
+			if settings.get('sidebar_sampling', 'stable') == 'random':
+				self.deterministic = False
+				links = random.sample(links, maximum)
+			else:
+				links = random.Random(f'{self.current_path}:{label}').sample(sorted(links, key=lambda link: link.url), maximum)
 		if sort:
 			links = sorted(links, key=lambda link: link.name)
 		return render('side_block.html', label=label, links=links)
@@ -114,47 +218,31 @@ class SearchPage(IPage):
 
 	@property
 	def content(self) -> str:
-		return render('search_results.html', query=self.request.query, found=[Link.from_path(self.request.root / x, None, self.request.root) for x in self.found])
+		return render('search_results.html', query=self.request.query, found=self.found, offset=self.offset, limit=self.limit, has_more=self.has_more)
 
 	@property
 	def current_path(self) -> Path:
 		return self.request.root
 
 	@staticmethod
-	def match_text(query: str, text: str, minimum_length: int = 3) -> bool:
-		"""
-		Whether query is a substring of text.
-		"""
-		if len(query) < minimum_length or len(text) < minimum_length:
-			return False
-		return query.lower() in text.lower()
-
-	@staticmethod
-	def match_content(query: str, file: Path, minimum_length: int = 3) -> bool:
-		"""
-		Whether query is a substring of text file's content.
-		"""
-		if (content := file.guess_text()) is not None and SearchPage.match_text(query, content.text, minimum_length=minimum_length):
-			return True
-		return False
+	def _parameter(value: str | None, default: int, minimum: int, maximum: int) -> int:
+		try:
+			return min(max(int(value), minimum), maximum) if value is not None else default
+		except ValueError:
+			return default
 
 	def __init__(self, request: SearchRequest):
 		super().__init__(request)
-		self.found = set()
-		for path in request.root.rglob('*'):
-			if any([
-				not path.is_dir() and not path.is_file(),
-				path.name.startswith('.'),
-				all([not parent.name.startswith('.') for parent in path.parents]),
-			]):
-				continue
-			if SearchPage.match_text(request.query, str(path.relative_to(request.root))):
-				self.found.add(path.relative_to(self.request.root))
-			elif path.is_file() and SearchPage.match_content(request.query, path):
-				self.found.add(path.relative_to(self.request.root))
-		for p, f in cache.files.items():
-			if f.content is not None and SearchPage.match_text(request.query, f.content):
-				self.found.add((cache.root / p).relative_to(self.request.root))
+		self.offset = SearchPage._parameter(request.parameters.get('offset'), 0, 0, 10_000)
+		self.limit = SearchPage._parameter(request.parameters.get('limit'), settings.get('search_page_size', 20), 1, 100)
+		paths, self.has_more = cache.index.rank(request.query, offset=self.offset, limit=self.limit)
+		self.found: list[tuple[Link, list[tuple[str, bool]]]] = []
+		"Links to found pages with highlighted snippets in order of relevance."
+		for p in paths:
+			# index may lag behind file system for a moment
+			if (path := cache.root / p).is_file():
+				_, text = cache.store.document(p) or ('', '')
+				self.found.append((Link.from_path(path, LinkType.Article, self.request.root), make_snippet(text, request.query)))
 
 
 class SectionPage(IPage):
@@ -168,6 +256,10 @@ class SectionPage(IPage):
 	def current_path(self) -> Path:
 		return self.request.path
 
+	def validators(self) -> tuple[str | None, float | None]:
+		digest, last_modified = self._layout_fingerprint()
+		return f'"{digest}"', last_modified
+
 	def __init__(self, request: SectionRequest):
 		super().__init__(request)
 		self.subsections: set[Path] = set()
@@ -183,7 +275,7 @@ class FilePage(IPage):
 
 	@property
 	def content(self) -> str | Response:
-		if (content := cache[self.current_path]) is not None:
+		if (content := self.entry.content) is not None:
 			return content
 		return FileResponse(self.current_path)
 
@@ -191,5 +283,55 @@ class FilePage(IPage):
 	def current_path(self) -> Path:
 		return self.request.path
 
+	@cached_property
+	def entry(self) -> CachedFile:
+		"""Up to date cache entry of requested file."""
+		return cache.get_entry(self.current_path)
+
+	def validators(self) -> tuple[str | None, float | None]:
+		digest, last_modified = self._layout_fingerprint()
+		# entry may be previous version of file while it is reconverted in background
+		modified = self.entry.mtime_ns / 1e9 if self.entry.mtime_ns is not None else self.current_path.stat().st_mtime
+		return f'"{sha1(f"{self.entry.sha1}:{digest}".encode("utf-8")).hexdigest()}"', max(last_modified, modified)
+
+	def render(self) -> Response:
+		response = super().render()
+		if (age := cache.stale_age(self.current_path)) is not None:
+			response.headers['X-Stale-Age'] = str(int(age))
+		return response
+
+	@cached_property
+	def backlinks(self) -> list[str]:
+		return cache.backlinks(self.current_path.relative_to(cache.root).to_url_format()) if self.current_path.is_relative_to(cache.root) else []
+
+	@cached_property
+	def linked(self) -> list[str]:
+		return cache.store.links(self.current_path.relative_to(cache.root).to_url_format()) if self.current_path.is_relative_to(cache.root) else []
+
+	def _negotiate_encoding(self) -> str | None:
+		if self.entry.content is None:
+			return None
+		return super()._negotiate_encoding()
+
 	def __init__(self, request: PageRequest):
 		super().__init__(request)
+
+
+class BrokenLinksPage(IPage):
+
+	@property
+	def content(self) -> str:
+		return render('broken_links.html', links=self.links)
+
+	@property
+	def current_path(self) -> Path:
+		return self.request.root
+
+	def __init__(self, request: BrokenLinksRequest):
+		super().__init__(request)
+		self.links: list[tuple[Link, str, str]] = []
+		"Links to pages with broken internal links, labels and paths of linked files which do not exist anymore (empty if not resolved)."
+		for source, label, target in cache.broken_links():
+			# link graph may lag behind file system for a moment
+			if (path := cache.root / source).is_file() and not (target and (cache.root / target).is_file()):
+				self.links.append((Link.from_path(path, LinkType.Article, self.request.root), label, target))
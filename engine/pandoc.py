@@ -0,0 +1,117 @@
+"""Execution of pandoc subprocesses with limited concurrency."""
+import os
+import subprocess
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from time import monotonic
+
+from engine.logging import logger
+from engine.settings import settings
+
+
+class PandocError(RuntimeError):
+	pass
+
+
+class PandocService:
+	"""
+	Runs pandoc conversions with bounded amount of concurrent subprocesses, the rest of jobs wait in queue.
+
+	Identical jobs running at the same time are executed once and all callers get the same output. Output is read from pipe so no temporary files are left. Queue wait and run times are counted by document type.
+
+	Limit is per process, i.e. every worker process runs its own pandoc subprocesses.
+	"""
+
+	def __init__(self, concurrency: int = 0, timeout: float = 60, executable: str = 'pandoc'):
+		"""
+		:param concurrency: maximum amount of running pandoc subprocesses. Use 0 for half of CPU count.
+		:param timeout: seconds given to single conversion.
+		:param executable: name or path of pandoc executable.
+		"""
+		self.concurrency = concurrency or max(1, (os.cpu_count() or 2) // 2)
+		self.timeout = timeout
+		self.executable = executable
+		self._slots = threading.BoundedSemaphore(self.concurrency)
+		self._lock = threading.Lock()
+		self._running: dict[tuple[str, ...], Future] = {}
+		"Futures of output by arguments of jobs which are queued or running."
+		self._waiting = 0
+		self._metrics: dict[str, dict[str, float]] = defaultdict(lambda: {'jobs': 0, 'deduplicated': 0, 'failed': 0, 'wait': 0.0, 'max_wait': 0.0, 'run': 0.0, 'max_run': 0.0})
+
+	def convert(self, path: str, *arguments: str, kind: str = '') -> str:
+		"""
+		Convert file to HTML.
+
+		:param path: path to converted file.
+		:param arguments: additional pandoc arguments, e.g. ('--extract-media', directory).
+		:param kind: type of document to count metrics by, e.g. file extension.
+		:return: HTML markup written by pandoc to standard output.
+		"""
+		key = (path, *arguments)
+		with self._lock:
+			future = self._running.get(key)
+			if owner := future is None:
+				future = self._running[key] = Future()
+				self._waiting += 1
+			else:
+				self._metrics[kind]['deduplicated'] += 1
+		if not owner:
+			return future.result()
+		try:
+			future.set_result(self._run(key, kind))
+		except BaseException as e:
+			future.set_exception(e)
+		finally:
+			with self._lock:
+				del self._running[key]
+		return future.result()
+
+	def _run(self, key: tuple[str, ...], kind: str) -> str:
+		queued = monotonic()
+		with self._slots:
+			started = monotonic()
+			with self._lock:
+				self._waiting -= 1
+			try:
+				process = subprocess.run([self.executable, '--to', 'html', *key[1:], key[0]], capture_output=True, timeout=self.timeout, stdin=subprocess.DEVNULL)
+			except subprocess.TimeoutExpired as e:
+				error = PandocError(f'pandoc has not converted {key[0]} in {self.timeout} seconds.')
+				self._count(kind, queued, started, error)
+				raise error from e
+			except OSError as e:
+				error = PandocError(f'Can not run pandoc: {e}')
+				self._count(kind, queued, started, error)
+				raise error from e
+		if process.returncode != 0:
+			error = PandocError(f'pandoc has failed to convert {key[0]} with code {process.returncode}: {process.stderr.decode("utf-8", errors="replace").strip()}')
+			self._count(kind, queued, started, error)
+			raise error
+		self._count(kind, queued, started)
+		return process.stdout.decode('utf-8')
+
+	def _count(self, kind: str, queued: float, started: float, error: PandocError | None = None):
+		wait, run = started - queued, monotonic() - started
+		if error is None:
+			logger.debug(f'pandoc converted {kind or "file"} in {run:.3f} seconds after {wait:.3f} seconds in queue.')
+		else:
+			logger.warning(f'pandoc job for {kind or "file"} failed in {run:.3f} seconds after {wait:.3f} seconds in queue: {error}')
+		with self._lock:
+			metrics = self._metrics[kind]
+			metrics['jobs'] += 1
+			metrics['failed'] += error is not None
+			metrics['wait'] += wait
+			metrics['max_wait'] = max(metrics['max_wait'], wait)
+			metrics['run'] += run
+			metrics['max_run'] = max(metrics['max_run'], run)
+
+	def stats(self) -> dict[str, object]:
+		"""
+		Queue state and counters of finished jobs (with total and maximum wait and run seconds) by document type.
+		"""
+		with self._lock:
+			return {'concurrency': self.concurrency, 'running': len(self._running) - self._waiting, 'waiting': self._waiting, 'types': {kind: dict(metrics) for kind, metrics in self._metrics.items()}}
+
+
+pandoc = PandocService(settings.get('pandoc_processes', 0), settings.get('pandoc_timeout', 60))
+"Pandoc service shared by converters."
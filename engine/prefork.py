@@ -0,0 +1,100 @@
+"""Pre-forking supervisor running web server in several processes."""
+import os
+import signal
+import socket
+from time import sleep
+from typing import Callable
+
+from engine.logging import logger
+from engine.path import Path
+from engine.webserver import bind
+
+Server = Callable[[socket.socket], None]
+"Callback serving forever on listening socket."
+
+
+def _fork(task: Callable[[], None]) -> int:
+	"""
+	Fork process running task and return its pid. Child process exits when task returns or fails.
+	"""
+	pid = os.fork()
+	if pid != 0:
+		return pid
+	code = 0
+	try:
+		signal.signal(signal.SIGTERM, signal.SIG_DFL)
+		task()
+	except KeyboardInterrupt:
+		pass
+	except BaseException as e:
+		logger.critical(f'Process {os.getpid()} failed: {e}')
+		logger.exception(e)
+		code = 1
+	finally:
+		os._exit(code)
+
+
+def _spawn(serve: Server, server: socket.socket | None, interface: str, port: int) -> int:
+	"""
+	Fork worker process and return its pid.
+
+	Worker listens on inherited socket or binds its own one with SO_REUSEPORT in case server is None.
+	"""
+	return _fork(lambda: serve(server or bind(interface, port, reuse_port=True)))
+
+
+def _interrupt(*_):
+	raise KeyboardInterrupt
+
+
+def serve_forked(serve: Server, interface: str = '0.0.0.0', port: int = 80, processes: int = 2, *, reuse_port: bool = False, respawn_delay: float = 1, background: Callable[[], None] | None = None):
+	"""
+	Run server in several worker processes and respawn them when they exit. Blocks until interrupted.
+
+	Module level state (e.g. cache) is prepared before forking and shared by workers.
+
+	:param serve: callback serving forever on listening socket.
+	:param interface: Interface IP v4 address or resolvable name (like "127.0.0.1" or "localhost") on which to serve. Use "0.0.0.0" for all connected interfaces.
+	:param port: Port on which to serve.
+	:param processes: amount of worker processes.
+	:param reuse_port: whether each worker binds own socket (SO_REUSEPORT) instead of sharing socket bound by master.
+	:param respawn_delay: seconds to wait before respawning exited worker.
+	"""
+	if not hasattr(os, 'fork'):
+		raise RuntimeError('Multiple processes are not supported on this platform.')
+	logger.info(f'Hosting at http://{interface or "localhost"}:{port} of {Path.cwd().resolve().absolute()} with {processes} processes.')
+	server = None if reuse_port else bind(interface, port)
+	workers: set[int] = set()
+	signal.signal(signal.SIGTERM, _interrupt)
+	others: set[int] = set()
+	try:
+		if background is not None:
+			others.add(_fork(background))
+		for _ in range(processes):
+			workers.add(_spawn(serve, server, interface, port))
+		while True:
+			pid, status = os.wait()
+			if pid not in workers:
+				others.discard(pid)
+				continue
+			workers.remove(pid)
+			logger.warning(f'Worker {pid} exited with code {os.waitstatus_to_exitcode(status)}. Respawning in {respawn_delay} seconds...')
+			sleep(respawn_delay)
+			workers.add(_spawn(serve, server, interface, port))
+	except KeyboardInterrupt:
+		logger.info('Stopping workers...')
+		for pid in workers | others:
+			try:
+				os.kill(pid, signal.SIGTERM)
+			except ProcessLookupError:
+				pass
+		for pid in workers | others:
+			try:
+				os.waitpid(pid, 0)
+			except ChildProcessError:
+				pass
+		logger.info('Exit')
+		raise
+	finally:
+		if server is not None:
+			server.close()
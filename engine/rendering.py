@@ -1,3 +1,7 @@
+import threading
+from collections import OrderedDict
+from hashlib import sha1
+
 import jinja2
 
 from engine.path import Path
@@ -15,3 +19,88 @@ def render(template: str, **rendering_arguments) -> str:
 	:param template: HTML markup template name (without .html extension) in ./templates/ directory.
 	"""
 	return templates.get_template(template).render(config=settings, **rendering_arguments)
+
+
+def fingerprint(*paths: Path) -> tuple[str, float]:
+	"""
+	Fingerprint of files affecting rendered markup: templates, config.toml and any additional paths (e.g. logo or directories listed in sidebar).
+
+	Only file system metadata is used so fingerprint is cheap to compute on each request.
+
+	:return: hash and the latest modification POSIX timestamp.
+	"""
+	digest = sha1()
+	latest = 0.0
+	for path in [*sorted((Path.cwd() / 'templates').glob('*')), Path.cwd() / 'config.toml', *paths]:
+		try:
+			stat = path.stat()
+		except OSError:
+			digest.update(f'{path}:missing;'.encode('utf-8'))
+			continue
+		digest.update(f'{path}:{stat.st_size}:{stat.st_mtime_ns};'.encode('utf-8'))
+		latest = max(latest, stat.st_mtime)
+	return digest.hexdigest(), latest
+
+
+class RenderedCache:
+	"""
+	Memory cache of rendered markup (and its compressed forms) of pages and their parts.
+
+	Each entry is stored with dependency key, i.e. fingerprint of everything it is rendered from, and is used only while the key is the same. The least recently used entries are evicted in case of memory limit overflow.
+	"""
+
+	def __init__(self, memory_limit: int = 0):
+		"""
+		:param memory_limit: maximum amount of bytes taken by cached markup. Use 0 for no limit.
+		"""
+		self.memory_limit = memory_limit
+		self._entries: OrderedDict[str, tuple[str, dict[str, bytes]]] = OrderedDict()
+		"Dependency key and markup by content coding (empty for identity) by entry name in order of usage (the last is the most recently used)."
+		self._size = 0
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, name: str, key: str, encoding: str = '') -> bytes | None:
+		"""
+		Get rendered markup in case it was rendered from the same dependencies.
+
+		:param name: entry name, e.g. kind of markup and path of rendered page.
+		:param key: current dependency key.
+		:param encoding: content coding of markup or empty string for identity.
+		"""
+		with self._lock:
+			stored_key, variants = self._entries.get(name, (None, {}))
+			if stored_key != key or (data := variants.get(encoding)) is None:
+				self.misses += 1
+				return
+			self._entries.move_to_end(name)
+			self.hits += 1
+			return data
+
+	def put(self, name: str, key: str, data: bytes, encoding: str = ''):
+		"""
+		Store rendered markup. Variants rendered from other dependencies are dropped.
+		"""
+		with self._lock:
+			stored_key, variants = self._entries.pop(name, (None, {}))
+			self._size -= sum(len(variant) for variant in variants.values())
+			if stored_key != key:
+				variants = {}
+			variants[encoding] = data
+			self._entries[name] = (key, variants)
+			self._size += sum(len(variant) for variant in variants.values())
+			while self.memory_limit and self._size > self.memory_limit and len(self._entries) > 1:
+				_, (_, evicted) = self._entries.popitem(last=False)
+				self._size -= sum(len(variant) for variant in evicted.values())
+
+	def stats(self) -> dict[str, int]:
+		"""
+		Counters of cached markup.
+		"""
+		with self._lock:
+			return {'entries': len(self._entries), 'memory': self._size, 'hits': self.hits, 'misses': self.misses}
+
+
+rendered = RenderedCache(settings.get('rendered_cache_limit', 0))
+"Cache of rendered pages and sidebars."
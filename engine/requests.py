@@ -3,7 +3,10 @@ from engine.path import Path
 
 class IRequest:
 	"Base class of user requests."
-	pass
+	headers: dict[str, str] = {}
+	"Header fields of HTTP request with lower cased names."
+	parameters: dict[str, str] = {}
+	"Query string parameters of HTTP request."
 
 
 class RedirectedRequest(IRequest):
@@ -16,6 +19,26 @@ class RedirectedRequest(IRequest):
 		return f'[Redirect] {self.url}'
 
 
+class HealthRequest(IRequest):
+	"Request of server state for orchestrators: liveness or readiness (warm cache)."
+
+	def __init__(self, check: str = ''):
+		self.check = check
+
+	def __str__(self):
+		return f'[Health] {self.check}'
+
+
+class SuggestRequest(IRequest):
+	"Request of search query completions."
+
+	def __init__(self, prefix: str):
+		self.prefix = prefix
+
+	def __str__(self):
+		return f'[Suggest] {self.prefix}'
+
+
 class RootRequest(IRequest):
 
 
@@ -39,6 +62,13 @@ class SearchRequest(RootRequest):
 		return f'[Search] {self.query}'
 
 
+class BrokenLinksRequest(RootRequest):
+	"Request of report on internal links to missing pages."
+
+	def __str__(self):
+		return '[Broken links]'
+
+
 class FileSystemRequest(RootRequest):
 	"Request of file or directory."
 
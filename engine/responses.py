@@ -1,4 +1,12 @@
+import asyncio
 import mimetypes
+import mmap
+import secrets
+import socket
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterable
+
+from engine.compression import encoders
 from engine.path import Path
 
 
@@ -7,12 +15,66 @@ class Response:
 	def __init__(self, code: int, text: str):
 		self.text = text
 		self.code = code
+		self.headers: dict[str, str] = {}
+		"Additional header fields."
+		self.keep_alive = False
+		"Whether connection stays open after response is sent."
+
+	@property
+	def body(self) -> bytes:
+		return b''
+
+	@property
+	def content_length(self) -> int:
+		return len(self.body)
 
 	def __str__(self) -> str:
-		return f'HTTP/1.1 {self.code} {self.text}'
+		headers = {**self.headers, 'Connection': 'keep-alive' if self.keep_alive else 'close'}
+		if self.code != 304:
+			headers['Content-Length'] = str(self.content_length)
+		return f'HTTP/1.1 {self.code} {self.text}' + ''.join(f'\r\n{name}: {value}' for name, value in headers.items())
+
+	def set_validators(self, etag: str | None, last_modified: float | None):
+		"""
+		Add ETag and Last-Modified header fields.
+
+		:param etag: quoted entity tag.
+		:param last_modified: POSIX timestamp of last modification.
+		"""
+		if etag:
+			self.headers['ETag'] = etag
+		if last_modified is not None:
+			self.headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+
+	def set_encoding(self, encoding: str | None):
+		"""
+		Mark response as negotiated by Accept-Encoding and add Content-Encoding of body if any.
+		"""
+		self.headers['Vary'] = 'Accept-Encoding'
+		if encoding:
+			self.headers['Content-Encoding'] = encoding
+
+	def head(self) -> bytes:
+		"""
+		Status line and headers terminated with empty line.
+		"""
+		return str(self).encode('utf-8') + b'\r\n\r\n'
 
 	def __bytes__(self) -> bytes:
-		return str(self).encode('utf-8')
+		return self.head() + self.body
+
+	def send(self, client: socket.socket):
+		"""
+		Send whole response to blocking socket.
+		"""
+		client.sendall(bytes(self))
+
+	async def send_async(self, writer: asyncio.StreamWriter):
+		"""
+		Send whole response to asyncio stream.
+		"""
+		writer.write(bytes(self))
+		await writer.drain()
 
 
 class RedirectResponse(Response):
@@ -20,9 +82,14 @@ class RedirectResponse(Response):
 	def __init__(self, url: str):
 		super().__init__(301, 'Moved Permanently')
 		self.url = url
+		self.headers['Location'] = url
 
-	def __str__(self) -> str:
-		return super().__str__() + f'\r\nLocation: {self.url}'
+
+class NotModifiedResponse(Response):
+
+	def __init__(self, etag: str | None = None, last_modified: float | None = None):
+		super().__init__(304, 'Not Modified')
+		self.set_validators(etag, last_modified)
 
 
 class NotFoundResponse(Response):
@@ -37,20 +104,146 @@ class DataResponse(Response):
 		super().__init__(200, 'OK')
 		self.mime = mime
 		self.data = data
+		self.headers['Content-Type'] = content_type(mime)
 
-	def __str__(self) -> str:
-		return super().__str__() + f'\r\nContent-Length: {len(self.data)}\r\nConnection: close\r\nContent-Type: {self.mime}{"; charset=utf-8" if self.mime.startswith("text") else ""}'
-
-	def __bytes__(self):
-		return super().__bytes__() + b'\r\n\r\n' + self.data
+	@property
+	def body(self) -> bytes:
+		return self.data
 
 
-class FileResponse(DataResponse):
+class FileResponse(Response):
+	"""
+	Response streaming file content straight from file descriptor (sendfile) without reading it into memory.
+	"""
 
-	def __init__(self, file: Path):
+	def __init__(self, file: Path, mime: str | None = None):
+		"""
+		:param file: path to file to send.
+		:param mime: content type. Guessed from file name by default.
+		"""
 		if not file.is_file():
 			raise ValueError(f'Can not read file at {file}.')
-		super().__init__(file.read_bytes(), mimetypes.guess_type(file, strict=False)[0] or 'application/octet-stream')
+		super().__init__(200, 'OK')
+		self.file = file
+		self.size = file.stat().st_size
+		self.mime = mime or mimetypes.guess_type(file, strict=False)[0] or 'application/octet-stream'
+		self.headers['Content-Type'] = content_type(self.mime)
+		self.headers['Accept-Ranges'] = 'bytes'
+
+	@property
+	def body(self) -> bytes:
+		with open(self.file, 'rb') as f:
+			return f.read(self.size)
+
+	@property
+	def content_length(self) -> int:
+		return self.size
+
+	def send(self, client: socket.socket):
+		client.sendall(self.head())
+		with open(self.file, 'rb') as f:
+			client.sendfile(f, 0, self.size)
+
+	async def send_async(self, writer: asyncio.StreamWriter):
+		writer.write(self.head())
+		with open(self.file, 'rb') as f:
+			await asyncio.get_running_loop().sendfile(writer.transport, f, 0, self.size)
+
+	def select_ranges(self, headers: dict[str, str]) -> Response:
+		"""
+		Answer Range request with part of file.
+
+		Range is ignored in case If-Range does not match current ETag or Last-Modified of this response.
+
+		:param headers: request header fields with lower cased names.
+		:return: this response, partial content or range not satisfiable response.
+		"""
+		if 'range' not in headers:
+			return self
+		if (if_range := headers.get('if-range')) is not None and if_range not in (self.headers.get('ETag'), self.headers.get('Last-Modified')):
+			return self
+		if (ranges := parse_ranges(headers['range'], self.size)) is None:
+			return self
+		if not ranges:
+			return RangeNotSatisfiableResponse(self.size)
+		response = PartialFileResponse(self.file, ranges, self.mime, self.size)
+		for name in ('ETag', 'Last-Modified', 'Vary', 'Content-Encoding', 'Cache-Control'):
+			if name in self.headers:
+				response.headers[name] = self.headers[name]
+		return response
+
+
+class PartialFileResponse(Response):
+	"""
+	Response with byte ranges of file sliced from its memory mapped view so file is never loaded entirely.
+
+	Single range is sent as is, several ranges are sent as multipart/byteranges.
+	"""
+
+	def __init__(self, file: Path, ranges: list[tuple[int, int]], mime: str, size: int):
+		"""
+		:param file: path to file to send.
+		:param ranges: inclusive byte ranges (first, last) within file.
+		:param mime: content type of the whole file.
+		:param size: size of the whole file.
+		"""
+		super().__init__(206, 'Partial Content')
+		self.file = file
+		self.size = size
+		part_type = content_type(mime)
+		self.headers['Accept-Ranges'] = 'bytes'
+		if len(ranges) == 1:
+			self.headers['Content-Type'] = part_type
+			self.headers['Content-Range'] = f'bytes {ranges[0][0]}-{ranges[0][1]}/{size}'
+			self.parts: list[tuple[bytes, int, int]] = [(b'', *ranges[0])]
+			"Headers of body part and inclusive byte range of file."
+			self.epilogue = b''
+		else:
+			boundary = secrets.token_hex(16)
+			self.headers['Content-Type'] = f'multipart/byteranges; boundary={boundary}'
+			self.parts = [(f'\r\n--{boundary}\r\nContent-Type: {part_type}\r\nContent-Range: bytes {first}-{last}/{size}\r\n\r\n'.encode('utf-8'), first, last) for first, last in ranges]
+			self.epilogue = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+
+	@property
+	def content_length(self) -> int:
+		return sum(len(header) + last - first + 1 for header, first, last in self.parts) + len(self.epilogue)
+
+	def _chunks(self, view: memoryview):
+		for header, first, last in self.parts:
+			if header:
+				yield header
+			yield view[first:last + 1]
+		if self.epilogue:
+			yield self.epilogue
+
+	@property
+	def body(self) -> bytes:
+		with open(self.file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+			return b''.join(bytes(chunk) for chunk in self._chunks(view))
+
+	def send(self, client: socket.socket):
+		client.sendall(self.head())
+		with open(self.file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+			for chunk in self._chunks(view):
+				client.sendall(chunk)
+				if isinstance(chunk, memoryview):
+					chunk.release()
+
+	async def send_async(self, writer: asyncio.StreamWriter):
+		writer.write(self.head())
+		with open(self.file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+			for chunk in self._chunks(view):
+				writer.write(chunk)
+				await writer.drain()
+				if isinstance(chunk, memoryview):
+					chunk.release()
+
+
+class RangeNotSatisfiableResponse(Response):
+
+	def __init__(self, size: int):
+		super().__init__(416, 'Range Not Satisfiable')
+		self.headers['Content-Range'] = f'bytes */{size}'
 
 
 class ServerErrorReponse(Response):
@@ -63,3 +256,91 @@ class BadRequestReponse(Response):
 
 	def __init__(self):
 		super().__init__(400, 'Bad Request')
+
+
+def content_type(mime: str) -> str:
+	"""
+	Content-Type header field value of mime type with UTF-8 charset for text types.
+	"""
+	return f'{mime}; charset=utf-8' if mime.startswith('text') else mime
+
+
+def is_not_modified(headers: dict[str, str], etag: str | None, last_modified: float | None) -> bool:
+	"""
+	Whether conditional request (If-None-Match, If-Modified-Since) can be answered with 304 Not Modified.
+
+	If-Modified-Since is ignored in case If-None-Match is present.
+
+	:param headers: request header fields with lower cased names.
+	:param etag: current quoted entity tag.
+	:param last_modified: current POSIX timestamp of last modification.
+	"""
+	if (if_none_match := headers.get('if-none-match')) is not None:
+		if etag is None:
+			return False
+		tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+		return '*' in tags or etag.removeprefix('W/') in tags
+	if (if_modified_since := headers.get('if-modified-since')) is not None and last_modified is not None:
+		try:
+			return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+		except (TypeError, ValueError):
+			return False
+	return False
+
+
+def negotiate_encoding(accept_encoding: str, available: Iterable[str] = encoders) -> str | None:
+	"""
+	Choose content coding of response by Accept-Encoding header field of request.
+
+	:param accept_encoding: value of Accept-Encoding header field, e.g. "gzip, deflate, br;q=0.9".
+	:param available: supported content codings in order of server preference (the last is the most preferred).
+	:return: the best acceptable content coding or None for identity.
+	"""
+	weights = {}
+	for item in accept_encoding.lower().split(','):
+		coding, _, parameters = item.partition(';')
+		weight = 1.0
+		if (parameters := parameters.strip()).startswith('q='):
+			try:
+				weight = float(parameters[2:])
+			except ValueError:
+				weight = 0.0
+		weights[coding.strip()] = weight
+	candidates = [(weights.get(coding, weights.get('*', 0.0)), order, coding) for order, coding in enumerate(available)]
+	candidates = [candidate for candidate in candidates if candidate[0] > 0]
+	return max(candidates)[2] if candidates else None
+
+
+def parse_ranges(header: str, size: int, limit: int = 16) -> list[tuple[int, int]] | None:
+	"""
+	Parse Range header field value, e.g. "bytes=0-99, 200-, -50".
+
+	:param header: value of Range header field.
+	:param size: size of the whole representation.
+	:param limit: maximum amount of ranges. Requests with more ranges are answered with the whole representation.
+	:return: inclusive byte ranges (first, last) clipped to size, empty list if none is satisfiable or None in case header is malformed and must be ignored.
+	"""
+	unit, _, specs = header.partition('=')
+	if unit.strip().lower() != 'bytes' or not specs.strip():
+		return
+	ranges = []
+	for spec in specs.split(','):
+		first, separator, last = spec.strip().partition('-')
+		if not separator:
+			return
+		try:
+			if not first:
+				suffix = int(last)
+				if suffix > 0 and size > 0:
+					ranges.append((max(size - suffix, 0), size - 1))
+				continue
+			first, last = int(first), int(last) if last else None
+		except ValueError:
+			return
+		if first < 0 or last is not None and last < first:
+			return
+		if first < size:
+			ranges.append((first, size - 1 if last is None else min(last, size - 1)))
+	if len(ranges) > limit:
+		return
+	return ranges
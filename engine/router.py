@@ -1,7 +1,7 @@
 from typing import Callable, Optional, Sequence
 
 from engine.path import make_relative_url, Path
-from engine.requests import IRequest, PageRequest, RedirectedRequest, ResourceRequest, SearchRequest, SectionRequest
+from engine.requests import BrokenLinksRequest, HealthRequest, IRequest, PageRequest, RedirectedRequest, ResourceRequest, SearchRequest, SectionRequest, SuggestRequest
 
 Router = Callable[[Path], Optional[IRequest]]
 
@@ -36,6 +36,12 @@ class FileSystemRouter:
 			if path.is_file():
 				return ResourceRequest(path, self.resources_root)
 			return
+		if path := requested_path.match_start('./health/'):
+			return HealthRequest(path.name)
+		if path := requested_path.match_start('./suggest/'):
+			return SuggestRequest(str(path).strip() if path != Path('.') else '')
+		if requested_path.match_start('./broken-links/'):
+			return BrokenLinksRequest(self.wiki_root)
 		if path := requested_path.match_start('./search/'):
 			return SearchRequest(str(path).strip(), wiki_root=self.wiki_root)
 		if path := requested_path.match_start('./wiki/'):
@@ -0,0 +1,277 @@
+"""Full-text search index of wiki pages."""
+from __future__ import annotations
+
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from html.parser import HTMLParser
+
+from engine.path import Path
+from engine.store import CacheStore
+from internallinks import TARGET_ATTRIBUTE
+
+_WORD = re.compile(r'\w+')
+_HEADINGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+DOCUMENTS_VERSION = 2
+"Version of search documents format. Cached files stored with other version are reconverted as their contents may lack data of documents, e.g. internal links."
+
+
+class _TextExtractor(HTMLParser):
+	"Collects text and headings of HTML markup skipping scripts and styles."
+
+	def __init__(self):
+		super().__init__(convert_charrefs=True)
+		self.parts: list[str] = []
+		self.headings: list[str] = []
+		self.links: list[tuple[str, str]] = []
+		"Paths of files linked by internal links (empty for broken links) and labels of links."
+		self._skipped = 0
+		self._heading: list[str] | None = None
+		self._link: tuple[str, list[str]] | None = None
+
+	def handle_starttag(self, tag, attrs):
+		if tag in ('script', 'style'):
+			self._skipped += 1
+		elif tag in _HEADINGS:
+			self._heading = []
+		elif tag == 'a' and (target := dict(attrs).get(TARGET_ATTRIBUTE)) is not None:
+			self._link = (target, [])
+
+	def handle_endtag(self, tag):
+		if tag in ('script', 'style') and self._skipped:
+			self._skipped -= 1
+		elif tag in _HEADINGS and self._heading is not None:
+			if heading := ' '.join(''.join(self._heading).split()):
+				self.headings.append(heading)
+			self._heading = None
+		elif tag == 'a' and self._link is not None:
+			self.links.append((self._link[0], ' '.join(''.join(self._link[1]).split())))
+			self._link = None
+
+	def handle_data(self, data):
+		if not self._skipped:
+			self.parts.append(data)
+			if self._heading is not None:
+				self._heading.append(data)
+			if self._link is not None:
+				self._link[1].append(data)
+
+
+def _extract(markup: str | None) -> _TextExtractor | None:
+	if not markup:
+		return
+	extractor = _TextExtractor()
+	extractor.feed(markup)
+	extractor.close()
+	return extractor
+
+
+def extract_text(markup: str | None) -> str:
+	"""
+	Extract plain text of converted HTML markup.
+	"""
+	return ' '.join(' '.join(extractor.parts).split()) if (extractor := _extract(markup)) is not None else ''
+
+
+def make_document(path: str, content: str | None) -> tuple[str, str, str, str, list[tuple[str, str]]]:
+	"""
+	Make search document of cached file: path, title, plain text, headings (one per line) and internal links (linked file path and label).
+	"""
+	if (extractor := _extract(content)) is None:
+		return path, Path(path).with_suffix('').name, '', '', []
+	return path, Path(path).with_suffix('').name, ' '.join(' '.join(extractor.parts).split()), '\n'.join(extractor.headings), list(dict.fromkeys(extractor.links))
+
+
+def tokenize(text: str) -> list[str]:
+	"""
+	Split lower cased text into words.
+	"""
+	return _WORD.findall(text.lower())
+
+
+def make_snippet(text: str, query: str, width: int = 200) -> list[tuple[str, bool]]:
+	"""
+	Cut fragment of text around the first match of query (or of its words) and split it into highlighted and plain parts.
+
+	:param text: plain text of page.
+	:param query: searched query.
+	:param width: approximate length of fragment.
+	:return: parts of fragment and whether each of them is a match.
+	"""
+	patterns = sorted({query.lower(), *[word for word in tokenize(query) if len(word) >= 3]}, key=len, reverse=True)
+	matcher = re.compile('|'.join(re.escape(pattern) for pattern in patterns), re.IGNORECASE)
+	first = matcher.search(text)
+	start = max(0, (first.start() if first else 0) - width // 3)
+	if start:
+		start = text.find(' ', start) + 1 or start
+	end = min(len(text), start + width)
+	if end < len(text) and (space := text.rfind(' ', start, end)) > start:
+		end = space
+	parts = [('…', False)] if start else []
+	position = start
+	for match in matcher.finditer(text, start, end):
+		if match.start() > position:
+			parts.append((text[position:match.start()], False))
+		parts.append((match.group(), True))
+		position = match.end()
+	if position < end:
+		parts.append((text[position:end], False))
+	if end < len(text):
+		parts.append(('…', False))
+	return parts
+
+
+class SuggestIndex:
+	"""
+	Sorted array of page names, section names and headings of pages for completion of search queries by prefix.
+	"""
+
+	def __init__(self):
+		self.entries: list[tuple[str, str, str, str]] = []
+		"Lower cased label, label, URL and type (page, section or heading) in ascending order."
+		self._pages: dict[str, list[tuple[str, str, str, str]]] = {}
+		"Entries added by page path."
+		self._sections: Counter[tuple[str, str, str, str]] = Counter()
+		"Amount of pages in sections."
+
+	def add(self, path: str, title: str, headings: list[str]):
+		self.update([(path, title, headings)])
+
+	def update(self, pages: list[tuple[str, str, list[str]]]):
+		"""
+		Add entries of several pages at once: paths, titles and headings of pages.
+
+		Entries are merged by sorting in case there are many of them (e.g. on the first synchronization) so array is not shifted on insertion of each entry.
+		"""
+		added = []
+		for path, title, headings in pages:
+			url = '/wiki/' + Path(path).with_suffix('').to_url_format()
+			entries = [(title.lower(), title, url, 'page'), *[(heading.lower(), heading, url, 'heading') for heading in dict.fromkeys(headings) if heading != title]]
+			added += entries
+			self._pages[path] = entries
+			for section in Path(path).parents[:-1]:
+				entry = (section.name.lower(), section.name, '/wiki/' + section.to_url_format(), 'section')
+				self._sections[entry] += 1
+				if self._sections[entry] == 1:
+					added.append(entry)
+		if len(added) > 16:
+			self.entries = sorted(self.entries + added)
+			return
+		for entry in added:
+			insort(self.entries, entry)
+
+	def remove(self, path: str):
+		if (entries := self._pages.pop(path, None)) is None:
+			return
+		for entry in entries:
+			self._discard(entry)
+		for section in Path(path).parents[:-1]:
+			entry = (section.name.lower(), section.name, '/wiki/' + section.to_url_format(), 'section')
+			self._sections[entry] -= 1
+			if self._sections[entry] <= 0:
+				del self._sections[entry]
+				self._discard(entry)
+
+	def _discard(self, entry: tuple[str, str, str, str]):
+		if (index := bisect_left(self.entries, entry)) < len(self.entries) and self.entries[index] == entry:
+			del self.entries[index]
+
+	def __len__(self) -> int:
+		"""
+		Amount of pages.
+		"""
+		return len(self._pages)
+
+	def suggest(self, prefix: str, limit: int = 10) -> list[dict[str, str]]:
+		"""
+		Find entries starting with prefix (case-insensitive) in alphabetical order.
+		"""
+		prefix = prefix.lower()
+		found = []
+		index = bisect_left(self.entries, (prefix,))
+		while index < len(self.entries) and len(found) < limit and (entry := self.entries[index])[0].startswith(prefix):
+			found.append({'title': entry[1], 'url': entry[2], 'type': entry[3]})
+			index += 1
+		return found
+
+
+class SearchIndex:
+	"""
+	Full-text search over paths and texts of pages backed by indexes of persistent store.
+
+	Substring semantics of search is kept: trigram index finds pages containing query exactly. Found pages are ranked by BM25 scores of words of query in their titles, paths and texts.
+
+	Completions are kept in memory and are read incrementally by revision of documents so index of each process catches up with pages converted by other processes.
+	"""
+
+	def __init__(self, store: CacheStore, weights: tuple[float, float, float] = (3, 2, 1)):
+		"""
+		:param store: persistent store of documents.
+		:param weights: weights of words found in title, path and text for ranking.
+		"""
+		self.store = store
+		self.weights = weights
+		self.revision = 0
+		"The latest revision of documents read from store."
+		self.suggestions = SuggestIndex()
+		"Completions of search queries."
+		self._lock = threading.Lock()
+
+	def sync(self):
+		"""
+		Read documents changed since the last synchronization.
+		"""
+		with self._lock:
+			pages = []
+			for path, title, headings, revision in self.store.documents(self.revision):
+				self.suggestions.remove(path)
+				if headings is not None:
+					pages.append((path, title, headings.splitlines()))
+				self.revision = revision
+			self.suggestions.update(pages)
+
+	def rank(self, query: str, offset: int = 0, limit: int = 20, minimum_length: int = 3) -> tuple[list[str], bool]:
+		"""
+		Find paths of documents containing query in path or text (case-insensitive) ordered by relevance.
+
+		Documents are scored by words of query (BM25 over title, path and text) by full-text indexes of store, all matches are scored and sorted there. Documents containing query only inside other words are not scored and follow scored ones.
+
+		:param query: searched substring.
+		:param offset: amount of skipped results.
+		:param limit: maximum amount of results.
+		:param minimum_length: minimum length of query (not less than 3).
+		:return: paths of found documents and whether there are more results.
+		"""
+		if len(query) < max(minimum_length, 3):
+			return [], False
+		self.sync()
+		found = self.store.rank(query, list(dict.fromkeys(tokenize(query))), self.weights, offset=offset, limit=limit + 1)
+		return found[:limit], len(found) > limit
+
+	def suggest(self, prefix: str, limit: int = 10) -> list[dict[str, str]]:
+		"""
+		Complete search query by names of pages and sections and headings of pages.
+
+		:param prefix: beginning of query.
+		:param limit: maximum amount of completions.
+		:return: titles, URLs and types of completions.
+		"""
+		self.sync()
+		with self._lock:
+			return self.suggestions.suggest(prefix, limit)
+
+	def stats(self) -> dict[str, int]:
+		"""
+		Size of index and amount of bytes taken by posting lists of full-text indexes in store.
+		"""
+		sizes = self.store.search_sizes()
+		with self._lock:
+			return {
+				'documents'  : len(self.suggestions),
+				'suggestions': len(self.suggestions.entries),
+				'revision'   : self.revision,
+				'words'      : sizes['words'],
+				'trigrams'   : sizes['trigrams'],
+			}
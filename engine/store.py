@@ -0,0 +1,263 @@
+"""Persistent storage of cache entries."""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from typing import Any, Iterable
+
+from engine.pageindex import split_label
+from engine.path import Path
+
+_COLUMNS = ('md5', 'sha1', 'size', 'mtime_ns', 'inode', 'content')
+
+
+def _link_name(label: str) -> str:
+	"""
+	The last part of name linked by label of internal link.
+	"""
+	return split_label(label)[0].rsplit('/', 1)[-1]
+
+
+def _quote(text: str) -> str:
+	"""
+	Full-text query string matching text as a phrase.
+	"""
+	return '"' + text.replace('"', '""') + '"'
+
+
+def _substring(text: str) -> str:
+	"""
+	Full-text query of trigram index matching documents containing text in path or text.
+	"""
+	return '{path text} : ' + _quote(text)
+
+
+class CacheStore:
+	"""
+	SQLite database (in WAL mode) of cache entries.
+
+	Each entry is written separately so only changed entries are updated. Concurrent readers and writers from several threads and processes are supported.
+
+	Search documents are indexed by FTS5 tables (SQLite 3.34 or newer is required for trigram tokenizer) so searching processes do not build indexes in memory.
+	"""
+
+	def __init__(self, path: Path, timeout: float = 30):
+		"""
+		:param path: path to database file.
+		:param timeout: seconds to wait for the database lock held by another writer.
+		"""
+		self.path = path
+		self.timeout = timeout
+		self._local = threading.local()
+
+	@property
+	def connection(self) -> sqlite3.Connection:
+		"""
+		Connection of current thread. Connections are never shared between threads or forked processes.
+		"""
+		if getattr(self._local, 'pid', None) != os.getpid():
+			connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+			connection.execute('PRAGMA journal_mode=WAL')
+			connection.execute('PRAGMA synchronous=NORMAL')
+			connection.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+			connection.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, md5 TEXT, sha1 TEXT, size INTEGER, mtime_ns INTEGER, inode INTEGER, content TEXT)')
+			# search documents are versioned by increasing revision so every process can catch up with changes incrementally, deleted documents are kept with NULL text
+			connection.execute('CREATE TABLE IF NOT EXISTS documents (path TEXT PRIMARY KEY, title TEXT, text TEXT, headings TEXT, revision INTEGER)')
+			if 'headings' not in [column[1] for column in connection.execute('PRAGMA table_info(documents)')]:
+				connection.execute('ALTER TABLE documents ADD COLUMN headings TEXT')
+			# internal links between pages: target is path of linked file or empty string for broken link
+			# name is the last part of linked name of label, i.e. beginning of name of file it can be resolved to
+			connection.execute('CREATE TABLE IF NOT EXISTS links (source TEXT, target TEXT, label TEXT, name TEXT)')
+			if 'name' not in [column[1] for column in connection.execute('PRAGMA table_info(links)')]:
+				connection.execute('ALTER TABLE links ADD COLUMN name TEXT')
+				connection.executemany('UPDATE links SET name = ? WHERE rowid = ?', [(_link_name(label), rowid) for rowid, label in connection.execute('SELECT rowid, label FROM links').fetchall()])
+			connection.execute('CREATE INDEX IF NOT EXISTS links_source ON links (source)')
+			connection.execute('CREATE INDEX IF NOT EXISTS links_target ON links (target)')
+			connection.execute("CREATE INDEX IF NOT EXISTS links_unresolved ON links (name) WHERE target = ''")
+			connection.execute('CREATE INDEX IF NOT EXISTS documents_revision ON documents (revision)')
+			if not connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'search_trigrams'").fetchone():
+				CacheStore._create_search(connection)
+			self._local.connection = connection
+			self._local.pid = os.getpid()
+		return self._local.connection
+
+	@staticmethod
+	def _create_search(connection: sqlite3.Connection):
+		"""
+		Create full-text indexes of present search documents (words for ranking and trigrams for substring match) kept up to date by triggers.
+		"""
+		with connection:
+			connection.execute('BEGIN IMMEDIATE')
+			if connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'search_trigrams'").fetchone():
+				return  # created by another process meanwhile
+			connection.execute("""CREATE VIRTUAL TABLE search_words USING fts5 (title, path, text, content='documents', content_rowid='rowid', tokenize="unicode61 remove_diacritics 0 tokenchars '_'")""")
+			connection.execute("CREATE VIRTUAL TABLE search_trigrams USING fts5 (path, text, content='documents', content_rowid='rowid', tokenize='trigram')")
+			connection.execute('''CREATE TRIGGER documents_insert AFTER INSERT ON documents WHEN new.text IS NOT NULL BEGIN
+				INSERT INTO search_words (rowid, title, path, text) VALUES (new.rowid, new.title, new.path, new.text);
+				INSERT INTO search_trigrams (rowid, path, text) VALUES (new.rowid, new.path, new.text);
+			END''')
+			connection.execute('''CREATE TRIGGER documents_delete AFTER DELETE ON documents WHEN old.text IS NOT NULL BEGIN
+				INSERT INTO search_words (search_words, rowid, title, path, text) VALUES ('delete', old.rowid, old.title, old.path, old.text);
+				INSERT INTO search_trigrams (search_trigrams, rowid, path, text) VALUES ('delete', old.rowid, old.path, old.text);
+			END''')
+			connection.execute('INSERT INTO search_words (rowid, title, path, text) SELECT rowid, title, path, text FROM documents WHERE text IS NOT NULL')
+			connection.execute('INSERT INTO search_trigrams (rowid, path, text) SELECT rowid, path, text FROM documents WHERE text IS NOT NULL')
+
+	def get_meta(self, name: str) -> str | None:
+		"""
+		Read named value describing the whole store.
+		"""
+		row = self.connection.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+		return row[0] if row else None
+
+	def set_meta(self, name: str, value: str):
+		self.connection.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+
+	@property
+	def version(self) -> int | None:
+		"""
+		Version of stored cache format or None for empty database.
+		"""
+		return int(value) if (value := self.get_meta('version')) is not None else None
+
+	@version.setter
+	def version(self, value: int):
+		self.set_meta('version', str(value))
+
+	def expire(self, paths: Iterable[str] | None = None):
+		"""
+		Forget file metadata and hashes of entries so they are reconverted but their contents can be served meanwhile.
+
+		:param paths: paths of expired entries. All entries are expired by default.
+		"""
+		if paths is None:
+			self.connection.execute('UPDATE files SET md5 = NULL, sha1 = NULL, size = NULL, mtime_ns = NULL, inode = NULL')
+			return
+		with self.connection as connection:
+			connection.execute('BEGIN IMMEDIATE')
+			connection.executemany('UPDATE files SET md5 = NULL, sha1 = NULL, size = NULL, mtime_ns = NULL, inode = NULL WHERE path = ?', [(path,) for path in paths])
+
+	def metadata(self) -> dict[str, dict[str, Any]]:
+		"""
+		Read all entries without converted content.
+		"""
+		rows = self.connection.execute(f'SELECT path, {", ".join(_COLUMNS[:-1])} FROM files')
+		return {row[0]: dict(zip(_COLUMNS[:-1], row[1:])) for row in rows}
+
+	def get(self, path: str) -> dict[str, Any] | None:
+		"""
+		Read single entry with content.
+		"""
+		row = self.connection.execute(f'SELECT {", ".join(_COLUMNS)} FROM files WHERE path = ?', (path,)).fetchone()
+		return dict(zip(_COLUMNS, row)) if row else None
+
+	def content(self, path: str) -> str | None:
+		"""
+		Read converted content of single entry.
+		"""
+		row = self.connection.execute('SELECT content FROM files WHERE path = ?', (path,)).fetchone()
+		return row[0] if row else None
+
+	def put(self, entries: Iterable[tuple[str, dict[str, Any]]], documents: Iterable[tuple[str, str, str, str, list[tuple[str, str]]]] = ()):
+		"""
+		Insert or replace entries, their search documents and outgoing links in single transaction.
+
+		:param entries: paths and serialized entries.
+		:param documents: paths, titles, plain texts, headings and internal links (linked file path and label) of search documents.
+		"""
+		with self.connection as connection:
+			connection.execute('BEGIN IMMEDIATE')
+			connection.executemany(f'INSERT OR REPLACE INTO files (path, {", ".join(_COLUMNS)}) VALUES (?{", ?" * len(_COLUMNS)})', [(path, *[data.get(column) for column in _COLUMNS]) for path, data in entries])
+			self._put_documents(connection, documents)
+
+	def delete(self, paths: Iterable[str]):
+		"""
+		Remove entries, their search documents and outgoing links in single transaction.
+		"""
+		paths = list(paths)
+		with self.connection as connection:
+			connection.execute('BEGIN IMMEDIATE')
+			connection.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in paths])
+			self._put_documents(connection, [(path, None, None, None, []) for path in paths])
+
+	@staticmethod
+	def _put_documents(connection: sqlite3.Connection, documents: Iterable[tuple[str, str | None, str | None, str | None, list[tuple[str, str]]]]):
+		documents = list(documents)
+		revision = connection.execute('SELECT COALESCE(MAX(revision), 0) + 1 FROM documents').fetchone()[0]
+		# replaced documents are deleted explicitly so triggers remove them from full-text indexes
+		connection.executemany('DELETE FROM documents WHERE path = ?', [(document[0],) for document in documents])
+		connection.executemany('INSERT INTO documents (path, title, text, headings, revision) VALUES (?, ?, ?, ?, ?)', [(*document[:4], revision) for document in documents])
+		connection.executemany('DELETE FROM links WHERE source = ?', [(document[0],) for document in documents])
+		connection.executemany('INSERT INTO links (source, target, label, name) VALUES (?, ?, ?, ?)', [(document[0], target, label, _link_name(label)) for document in documents for target, label in document[4]])
+
+	def documents(self, since: int = 0) -> list[tuple[str, str | None, str | None, int]]:
+		"""
+		Read search documents changed after defined revision without their texts: path, title, headings (None for deleted documents) and revision.
+		"""
+		return self.connection.execute("SELECT path, title, CASE WHEN text IS NULL THEN NULL ELSE COALESCE(headings, '') END, revision FROM documents WHERE revision > ? ORDER BY revision", (since,)).fetchall()
+
+	def rank(self, query: str, words: list[str], weights: tuple[float, float, float], offset: int = 0, limit: int = -1) -> list[str]:
+		"""
+		Read paths of present documents containing query in path or text (case-insensitive) ordered by BM25 score of words in title, path and text. Documents without any of words follow scored ones in alphabetical order.
+
+		Every document matching query is scored and sorted before offset and limit are applied, i.e. there is no early termination: full-text indexes do not keep documents of word ordered by score, so cost grows with amount of matches rather than with requested page.
+
+		:param query: searched substring of at least three characters.
+		:param words: scored words of query.
+		:param weights: weights of words found in title, path and text.
+		:param offset: amount of skipped documents.
+		:param limit: maximum amount of documents or -1 for all of them.
+		"""
+		if not words:
+			return [row[0] for row in self.connection.execute('SELECT documents.path FROM search_trigrams JOIN documents ON documents.rowid = search_trigrams.rowid WHERE search_trigrams MATCH ? ORDER BY documents.path LIMIT ? OFFSET ?', (_substring(query), limit, offset))]
+		rows = self.connection.execute(
+			'SELECT documents.path FROM search_trigrams JOIN documents ON documents.rowid = search_trigrams.rowid '
+			'LEFT JOIN (SELECT rowid, bm25(search_words, ?, ?, ?) AS score FROM search_words WHERE search_words MATCH ?) AS scored ON scored.rowid = search_trigrams.rowid '
+			'WHERE search_trigrams MATCH ? ORDER BY scored.score IS NULL, scored.score, documents.path LIMIT ? OFFSET ?',
+			(*weights, ' OR '.join(_quote(word) for word in words), _substring(query), limit, offset))
+		return [row[0] for row in rows]
+
+	def document(self, path: str) -> tuple[str, str] | None:
+		"""
+		Read title and plain text of search document.
+		"""
+		row = self.connection.execute('SELECT title, text FROM documents WHERE path = ? AND text IS NOT NULL', (path,)).fetchone()
+		return tuple(row) if row else None
+
+	def unindexed(self) -> list[tuple[str, str | None]]:
+		"""
+		Read paths and contents of entries without search documents, e.g. stored by previous versions.
+		"""
+		return self.connection.execute('SELECT files.path, files.content FROM files LEFT JOIN documents ON documents.path = files.path WHERE documents.path IS NULL').fetchall()
+
+	def backlinks(self, target: str) -> list[str]:
+		"""
+		Read paths of files linking to defined file.
+		"""
+		return [row[0] for row in self.connection.execute('SELECT DISTINCT source FROM links WHERE target = ? AND source != target ORDER BY source', (target,))]
+
+	def links(self, source: str) -> list[str]:
+		"""
+		Read paths of files linked by defined file (empty for broken links).
+		"""
+		return [row[0] for row in self.connection.execute('SELECT target FROM links WHERE source = ? ORDER BY target, label', (source,))]
+
+	def search_sizes(self) -> dict[str, int]:
+		"""
+		Size in bytes of posting lists of full-text indexes: words and trigrams.
+		"""
+		return {name: self.connection.execute(f'SELECT COALESCE(SUM(LENGTH(block)), 0) FROM search_{name}_data').fetchone()[0] for name in ('words', 'trigrams')}
+
+	def unresolved_links(self, name: str) -> list[tuple[str, str]]:
+		"""
+		Read links not resolved on conversion which may resolve to file with defined name: source path and label.
+		"""
+		names = [name[:length] for length in range(len(name) + 1)]
+		return self.connection.execute(f"SELECT source, label FROM links WHERE target = '' AND name IN ({', '.join('?' * len(names))}) ORDER BY source", names).fetchall()
+
+	def broken_links(self) -> list[tuple[str, str, str]]:
+		"""
+		Read internal links to files that are not found or not cached anymore: source path, label and target path (empty if not resolved).
+		"""
+		return self.connection.execute("SELECT links.source, links.label, links.target FROM links LEFT JOIN files ON files.path = links.target WHERE links.target = '' OR files.path IS NULL ORDER BY links.source, links.label").fetchall()
@@ -0,0 +1,220 @@
+"""Watching of wiki directory for changed, created and deleted files."""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+from abc import ABC, abstractmethod
+from time import monotonic
+from typing import Callable
+
+from engine.logging import logger
+from engine.path import Path
+
+ChangesHandler = Callable[[set[Path]], None]
+"Callback receiving paths of changed, created or deleted files and directories."
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF
+_EVENT = struct.Struct('iIII')
+
+
+def _is_hidden(path: Path, root: Path) -> bool:
+	return any(part.startswith('.') for part in path.relative_to(root).parts)
+
+
+class Watcher(ABC):
+	"""
+	Base class of watchers running in daemon thread.
+
+	Changes are collected until directory stays quiet for debounce period and then are passed to handler at once.
+	"""
+
+	def __init__(self, root: Path, handle: ChangesHandler, debounce: float = 0.5):
+		"""
+		:param root: watched directory (recursively).
+		:param handle: callback receiving changed paths.
+		:param debounce: seconds of quiet period before changes are handled.
+		"""
+		self.root = root
+		self.handle = handle
+		self.debounce = debounce
+		self._changes: set[Path] = set()
+		self._stopped = threading.Event()
+		self._thread = threading.Thread(target=self._run, name=f'wiki-{type(self).__name__.lower()}', daemon=True)
+
+	def start(self) -> 'Watcher':
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._stopped.set()
+
+	def join(self):
+		"""
+		Block until watcher is stopped.
+		"""
+		self._thread.join()
+
+	@abstractmethod
+	def _run(self):
+		"""Must watch directory and handle changes until watcher is stopped."""
+		...
+
+	def _add(self, path: Path):
+		if not _is_hidden(path, self.root):
+			self._changes.add(path)
+
+	def _flush(self):
+		if not self._changes:
+			return
+		changes, self._changes = self._changes, set()
+		try:
+			self.handle(changes)
+		except Exception as e:
+			logger.error(f'Can not handle changes of {self.root}: {e}')
+			logger.exception(e)
+
+
+class InotifyWatcher(Watcher):
+	"""
+	Watcher using Linux inotify API. Every directory is watched separately so new directories are watched as soon as they are created.
+	"""
+
+	def __init__(self, root: Path, handle: ChangesHandler, debounce: float = 0.5):
+		super().__init__(root, handle, debounce)
+		libc_name = ctypes.util.find_library('c')
+		self._libc = ctypes.CDLL(libc_name, use_errno=True)
+		if not hasattr(self._libc, 'inotify_init1'):
+			raise OSError('inotify is not supported on this platform.')
+		self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+		if self._fd < 0:
+			raise OSError(ctypes.get_errno(), 'Can not initialize inotify.')
+		self._directories: dict[int, Path] = {}
+		try:
+			self._watch_tree(root)
+		except OSError:
+			os.close(self._fd)
+			raise
+
+	def _watch(self, directory: Path):
+		wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+		if wd < 0:
+			raise OSError(ctypes.get_errno(), f'Can not watch {directory}.')
+		self._directories[wd] = directory
+
+	def _watch_tree(self, directory: Path):
+		self._watch(directory)
+		for parent, directories, _ in os.walk(directory):
+			for name in directories:
+				if not name.startswith('.'):
+					self._watch(Path(parent) / name)
+			directories[:] = [name for name in directories if not name.startswith('.')]
+
+	def _read(self):
+		try:
+			data = os.read(self._fd, 64 * 1024)
+		except BlockingIOError:
+			return
+		offset = 0
+		while offset < len(data):
+			wd, mask, _, length = _EVENT.unpack_from(data, offset)
+			name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+			offset += _EVENT.size + length
+			if mask & _IN_Q_OVERFLOW:
+				# events are lost so every file may have changed
+				self._add(self.root)
+				continue
+			if mask & _IN_IGNORED:
+				self._directories.pop(wd, None)
+				continue
+			if (directory := self._directories.get(wd)) is None or not name:
+				continue
+			path = directory / os.fsdecode(name)
+			self._add(path)
+			if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO) and not _is_hidden(path, self.root):
+				try:
+					self._watch_tree(path)
+				except OSError as e:
+					logger.warning(f'Can not watch {path}: {e}')
+
+	def _run(self):
+		logger.info(f'Watching {self.root} with inotify.')
+		last_event = monotonic()
+		try:
+			while not self._stopped.is_set():
+				readable, _, _ = select.select([self._fd], [], [], self.debounce)
+				if readable:
+					self._read()
+					last_event = monotonic()
+				elif monotonic() - last_event >= self.debounce:
+					self._flush()
+		finally:
+			os.close(self._fd)
+
+
+class PollingWatcher(Watcher):
+	"""
+	Watcher comparing file metadata (size, modification time, inode) of the whole directory periodically.
+	"""
+
+	def __init__(self, root: Path, handle: ChangesHandler, debounce: float = 0.5, interval: float = 2):
+		"""
+		:param interval: seconds between directory scans.
+		"""
+		super().__init__(root, handle, debounce)
+		self.interval = interval
+
+	def _scan(self) -> dict[Path, tuple[int, int, int]]:
+		snapshot = {}
+		for parent, directories, files in os.walk(self.root):
+			directories[:] = [name for name in directories if not name.startswith('.')]
+			for name in files:
+				if name.startswith('.'):
+					continue
+				path = Path(parent) / name
+				try:
+					stat = path.stat()
+				except OSError:
+					continue
+				snapshot[path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+		return snapshot
+
+	def _run(self):
+		logger.info(f'Watching {self.root} by polling every {self.interval} seconds.')
+		snapshot = self._scan()
+		while not self._stopped.wait(self.interval):
+			current = self._scan()
+			for path in current.keys() | snapshot.keys():
+				if current.get(path) != snapshot.get(path):
+					self._add(path)
+			snapshot = current
+			self._flush()
+
+
+def watch(root: Path, handle: ChangesHandler, interval: float = 2) -> Watcher:
+	"""
+	Start watching directory with inotify or by polling in case inotify is not available.
+
+	:param root: watched directory (recursively).
+	:param handle: callback receiving changed paths.
+	:param interval: seconds between directory scans of polling watcher.
+	"""
+	try:
+		return InotifyWatcher(root, handle).start()
+	except (OSError, AttributeError) as e:
+		logger.warning(f'Can not use inotify ({e}), falling back to polling.')
+		return PollingWatcher(root, handle, interval=interval).start()
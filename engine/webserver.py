@@ -3,7 +3,10 @@ import os
 import re
 import socket
 import sys
+import threading
 import urllib
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
 from typing import Optional
 from urllib.parse import urlparse
 
@@ -27,6 +30,41 @@ def _parse_request_path(text: str) -> Optional[Path]:
 		return Path('.' + urllib.parse.unquote(url.path))
 
 
+def _parse_request_parameters(text: str) -> dict[str, str]:
+	"""
+	Parse query string parameters of HTTP request. The last value is used for repeated parameters.
+	"""
+	if (match := re.match(r'\s*GET\s+([^\s]+)', text)) is not None:
+		return dict(urllib.parse.parse_qsl(urlparse(match.group(1)).query))
+	return {}
+
+
+def _parse_request_headers(text: str) -> dict[str, str]:
+	"""
+	Parse header fields of HTTP request. Field names are lower cased.
+	"""
+	headers = {}
+	for line in text.split('\r\n')[1:]:
+		if not line:
+			break
+		name, separator, value = line.partition(':')
+		if separator:
+			headers[name.strip().lower()] = value.strip()
+	return headers
+
+
+def _is_keep_alive(text: str) -> bool:
+	"""
+	Whether client asks to keep connection open after response. HTTP/1.1 connections are persistent by default.
+	"""
+	if (match := re.match(r'\s*\S+\s+\S+\s+HTTP/(\d+\.\d+)', text)) is None:
+		return False
+	connection = _parse_request_headers(text).get('connection', '').lower()
+	if match.group(1) == '1.0':
+		return 'keep-alive' in connection
+	return 'close' not in connection
+
+
 def _process_request(request: str, *, router: Router, handle: RequestHandler) -> Response:
 	try:
 		if (requested_path := _parse_request_path(request)) is None:
@@ -41,6 +79,8 @@ def _process_request(request: str, *, router: Router, handle: RequestHandler) ->
 		if routed_request is None:
 			return NotFoundResponse()
 		logger.info('\tRouted to ', str(routed_request))
+		routed_request.headers = _parse_request_headers(request)
+		routed_request.parameters = _parse_request_parameters(request)
 		return handle(routed_request)
 	except Exception as ex:
 		logger.warning('\tError', str(ex))
@@ -50,7 +90,128 @@ def _process_request(request: str, *, router: Router, handle: RequestHandler) ->
 		return ServerErrorReponse()
 
 
-def serve(interface: str = '0.0.0.0', port: int = 80, router: Router = FileSystemRouter(), handle: RequestHandler = handle_request_by_type, buble_sigint: bool = False):
+def _receive_request(client: socket.socket, limit: int = 16384) -> bytes:
+	"""
+	Receive request line and header fields until empty line or limit of bytes.
+	"""
+	request = b''
+	while b'\r\n\r\n' not in request and len(request) < limit:
+		if not (chunk := client.recv(4096)):
+			break
+		request += chunk
+	return request
+
+
+def _serve_client(client: socket.socket, addr, *, router: Router, handle: RequestHandler):
+	"""
+	Receive single request from connected client, send response and disconnect.
+	"""
+	try:
+		logger.info('Connected by', addr)
+		request = _receive_request(client)
+		response = _process_request(request.decode('utf-8'), router=router, handle=handle)
+		logger.debug('\tSending response', response.code, response.text)
+		response.send(client)
+		logger.debug('\tDisconnecting client\r\n')
+	finally:
+		client.close()
+
+
+class WorkerPool:
+	"""
+	Bounded pool of threads serving accepted clients.
+
+	Accepting thread blocks when all workers are busy and queue is full so excessive clients wait in socket backlog.
+	"""
+
+	def __init__(self, workers: int, queue_size: int | None = None, *, router: Router, handle: RequestHandler):
+		"""
+		:param workers: amount of threads processing requests.
+		:param queue_size: maximum amount of accepted clients waiting for free worker. Default is the amount of workers.
+		:param router: routing callback passed to each request processing.
+		:param handle: response body generation callback passed to each request processing.
+		"""
+		self.workers = workers
+		self.queue_size = workers if queue_size is None else queue_size
+		self.router = router
+		self.handle = handle
+		self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wiki-worker')
+		self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+		self._lock = threading.Lock()
+		self._started = monotonic()
+		self._busy_time = 0.0
+		self.queued = 0
+		"Amount of accepted clients waiting for free worker."
+		self.active = 0
+		"Amount of workers processing requests right now."
+		self.processed = 0
+		"Total amount of served clients."
+
+	def submit(self, client: socket.socket, addr):
+		"""
+		Pass accepted client to the pool. Blocks while pool is full.
+		"""
+		self._slots.acquire()
+		with self._lock:
+			self.queued += 1
+		self._executor.submit(self._run, client, addr)
+
+	def _run(self, client: socket.socket, addr):
+		with self._lock:
+			self.queued -= 1
+			self.active += 1
+		started = monotonic()
+		try:
+			_serve_client(client, addr, router=self.router, handle=self.handle)
+		except Exception as e:
+			logger.warning(f'Error while processing request: {e}')
+			logger.exception(e)
+		finally:
+			with self._lock:
+				self.active -= 1
+				self.processed += 1
+				self._busy_time += monotonic() - started
+			self._slots.release()
+
+	def stats(self) -> dict[str, int | float]:
+		"""
+		Current counters: queue depth, busy workers, served clients and workers utilisation (0..1) since start.
+		"""
+		with self._lock:
+			elapsed = monotonic() - self._started
+			return {
+				'workers'    : self.workers,
+				'queued'     : self.queued,
+				'active'     : self.active,
+				'processed'  : self.processed,
+				'utilisation': self._busy_time / (elapsed * self.workers) if elapsed > 0 else 0.0,
+			}
+
+	def shutdown(self):
+		self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def bind(interface: str = '0.0.0.0', port: int = 80, *, reuse_port: bool = False) -> socket.socket:
+	"""
+	Create listening socket.
+
+	:param interface: Interface IP v4 address or resolvable name (like "127.0.0.1" or "localhost") on which to serve. Use "0.0.0.0" for all connected interfaces.
+	:param port: Port on which to serve.
+	:param reuse_port: whether to allow other sockets to listen on the same port so kernel balances connections between them (SO_REUSEPORT).
+	"""
+	server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	try:
+		if reuse_port:
+			server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+		server.bind((interface, port))
+		server.listen(999)
+	except BaseException:
+		server.close()
+		raise
+	return server
+
+
+def serve(interface: str = '0.0.0.0', port: int = 80, router: Router = FileSystemRouter(), handle: RequestHandler = handle_request_by_type, buble_sigint: bool = False, workers: int = 0, stats_interval: float = 60, server: socket.socket | None = None):
 	"""
 	Listen forever.
 
@@ -58,23 +219,30 @@ def serve(interface: str = '0.0.0.0', port: int = 80, router: Router = FileSyste
 	:param port: Port on which to serve.
 	:param router: routing callback that must return requested path or None for 404 Error.
 	:param handle:  response body generation callback.
+	:param workers: amount of threads serving clients concurrently. Use 0 to serve clients one by one in accepting thread.
+	:param stats_interval: period in seconds of logging worker pool counters.
+	:param server: already listening socket, e.g. inherited from parent process. Interface and port are ignored in this case.
 	"""
-	logger.info(f'Hosting at http://{interface or "localhost"}:{port} of {Path.cwd().resolve().absolute()}.')
-	with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+	if server is None:
+		logger.info(f'Hosting at http://{interface or "localhost"}:{port} of {Path.cwd().resolve().absolute()}.')
+		server = bind(interface, port)
+	pool = WorkerPool(workers, router=router, handle=handle) if workers > 0 else None
+	if pool:
+		logger.info(f'Serving clients with {workers} workers.')
+	reported = monotonic()
+	with server:
 		server.settimeout(1)
-		server.bind((interface, port))
-		server.listen(999)
 		try:
 			while True:
 				try:
+					if pool and monotonic() - reported >= stats_interval:
+						reported = monotonic()
+						logger.info('Workers stats: {queued} queued, {active}/{workers} active, {processed} processed, {utilisation:.1%} utilisation.', **pool.stats())
 					client, addr = server.accept()
-					logger.info('Connected by', addr)
-					request = client.recv(2048)  # according to https://stackoverflow.com/a/417184 maximum url length is up to 2000 characters so 2048 bytes buffer size must be enough ro receive main path header
-					response = _process_request(request.decode('utf-8'), router=router, handle=handle)
-					logger.debug('\tSending response', response.code, response.text)
-					client.sendall(bytes(response))
-					logger.debug('\tDisconnecting client\r\n')
-					client.close()
+					if pool:
+						pool.submit(client, addr)
+					else:
+						_serve_client(client, addr, router=router, handle=handle)
 				except TimeoutError:
 					logger.debug('Timed out')
 				except Exception as e:
@@ -84,6 +252,9 @@ def serve(interface: str = '0.0.0.0', port: int = 80, router: Router = FileSyste
 			logger.info('Exit')
 			if buble_sigint:
 				raise
+		finally:
+			if pool:
+				pool.shutdown()
 
 
 if __name__ == '__main__':
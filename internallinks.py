@@ -2,6 +2,7 @@
 Modified WikiLinks Extension for Python-Markdown
 ======================================
 Added ability to set custom pattern of markdown inline syntax via "pattern" option. Also label can be changed via second return value.
+Optional third return value is path of linked file (None for broken link). It is kept in data-wiki-target attribute (empty for broken link) so links can be collected from converted markup, broken links get additional "broken" class.
 ======================================
 
 Converts [[WikiLinks]] to relative links.
@@ -22,6 +23,9 @@ from markdown.inlinepatterns import InlineProcessor
 from markdown.extensions.wikilinks import build_url
 import xml.etree.ElementTree as etree
 
+TARGET_ATTRIBUTE = 'data-wiki-target'
+"Attribute of rendered link keeping path of linked file (empty for broken link)."
+
 
 class InternalLinkExtension(Extension):
 
@@ -30,7 +34,7 @@ class InternalLinkExtension(Extension):
 			'base_url'  : ['/', 'String to append to beginning or URL.'],
 			'end_url'   : ['/', 'String to append to end of URL.'],
 			'html_class': ['wikilink', 'CSS hook. Leave blank for none.'],
-			'build_url' : [build_url, 'Callable formats URL and label.'],
+			'build_url' : [build_url, 'Callable formats URL, label and optionally path of linked file.'],
 			'pattern'   : [r'\[\[([\w0-9_ -]+)\]\]', 'Regular expression pattern for markdown inline syntax.'],
 		}
 
@@ -55,10 +59,14 @@ class InternalLinksInlineProcessor(InlineProcessor):
 		if m.group(1).strip():
 			base_url, end_url, html_class = self._getMeta()
 			label = m.group(1).strip()
-			url, label = self.config['build_url'](label, base_url, end_url)
+			url, label, *target = self.config['build_url'](label, base_url, end_url)
 			a = etree.Element('a')
 			a.text = label
 			a.set('href', url)
+			if target:
+				a.set(TARGET_ATTRIBUTE, target[0] or '')
+				if target[0] is None:
+					html_class = f'{html_class} broken'.strip()
 			if html_class:
 				a.set('class', html_class)
 		else:
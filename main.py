@@ -1,3 +1,6 @@
+from enum import Enum
+from functools import partial
+from threading import Thread
 from time import sleep
 from typing import Annotated
 
@@ -8,11 +11,20 @@ from engine.settings import settings
 
 __version__ = '0.2.0'
 
-from engine.webserver import serve
+from engine import asyncserver, prefork, webserver
+from engine.cache import cache
+from engine.compression import precompress
+from engine.path import Path
 
 app = typer.Typer(add_completion=False)
 
 
+class Engine(str, Enum):
+	"Web server implementation."
+	socket = 'socket'
+	asyncio = 'asyncio'
+
+
 def validate_port(port: int) -> int:
 	"""
 	Check whether port index is valid.
@@ -22,6 +34,24 @@ def validate_port(port: int) -> int:
 	return port
 
 
+def validate_workers(workers: int) -> int:
+	"""
+	Check whether amount of workers is valid.
+	"""
+	if workers < 0:
+		raise typer.BadParameter('Workers amount must be non-negative.')
+	return workers
+
+
+def validate_processes(processes: int) -> int:
+	"""
+	Check whether amount of processes is valid.
+	"""
+	if processes < 0:
+		raise typer.BadParameter('Processes amount must be non-negative.')
+	return processes
+
+
 def show_version(value: bool):
 	"""
 	Print version information and exit.
@@ -38,15 +68,42 @@ def cli(
 		version: Annotated[bool, typer.Option("--version", callback=show_version, is_eager=True, help=show_version.__doc__)] = False,
 		debug: Annotated[bool, typer.Option('--debug', help='Print more information about errors.', show_default=True, envvar='DEBUG')] = False,
 		restart: Annotated[bool, typer.Option('--restart', help='Self-restart on critical error.', show_default=True, envvar='WIKI_RESTART')] = False,
+		engine: Annotated[Engine, typer.Option('--engine', '-e', help='Web server implementation: "socket" serves single request per connection, "asyncio" keeps connections alive. Overwrites config.toml.', show_default=True, envvar='WIKI_ENGINE')] = settings.get('engine', Engine.socket.value),
+		workers: Annotated[int, typer.Option('--workers', '-w', help='Amount of threads serving requests concurrently. Use 0 to serve requests one by one (or default amount of threads for asyncio engine). Overwrites config.toml.', callback=validate_workers, show_default=True, envvar='WIKI_WORKERS')] = settings.get('workers', 0),
+		processes: Annotated[int, typer.Option('--processes', help='Amount of forked worker processes supervised and respawned by master process. Use 0 to serve in single process. Overwrites config.toml.', callback=validate_processes, show_default=True, envvar='WIKI_PROCESSES')] = settings.get('processes', 0),
+		reuse_port: Annotated[bool, typer.Option('--reuse-port', help='Let each worker process bind own socket with SO_REUSEPORT instead of sharing master socket.', show_default=True, envvar='WIKI_REUSE_PORT')] = False,
+		precompress_resources: Annotated[bool, typer.Option('--precompress/--no-precompress', help='Build compressed copies (.gz, .br) of resources at startup. Otherwise, they are built on first request. Overwrites config.toml.', show_default=True, envvar='WIKI_PRECOMPRESS')] = settings.get('precompress', True),
+		watch: Annotated[bool, typer.Option('--watch/--no-watch', help='Watch wiki directory (with inotify or by polling) and reconvert changed files in background instead of validating files on each request. Overwrites config.toml.', show_default=True, envvar='WIKI_WATCH')] = settings.get('watch', False),
 
 ):
 	"""
 	Run wiki server.
 	"""
+	if precompress_resources:
+		logger.info(f'Precompressed {precompress(Path.cwd() / "resources")} resources.')
+	if engine is Engine.asyncio:
+		serve = partial(asyncserver.serve, buble_sigint=True, workers=workers, idle_timeout=settings.get('keep_alive_timeout', 5))
+	else:
+		serve = partial(webserver.serve, buble_sigint=True, workers=workers)
+	warm_up = partial(cache.warm_up, watch=watch, watch_interval=settings.get('watch_interval', 2))
+
+	def warm_up_and_watch():
+		warm_up()
+		if cache.watcher is not None:
+			cache.watcher.join()
+
+	# server starts immediately while cache is warming up, see /health/warm
+	if processes:
+		try:
+			# workers validate files by stat and read entries reconverted by watching process from store
+			prefork.serve_forked(lambda server: serve(server=server), interface=interface, port=port, processes=processes, reuse_port=reuse_port, background=warm_up_and_watch)
+		except KeyboardInterrupt:
+			raise typer.Exit(0)
+	Thread(target=warm_up, name='wiki-warm-up', daemon=True).start()
 	while True:
 		try:
 			logger.info('Starting Simple Wiki...')
-			serve(interface=interface, port=port, buble_sigint=True)
+			serve(interface=interface, port=port)
 		except KeyboardInterrupt:
 			raise typer.Exit(0)
 		except Exception as e:
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from engine.cache import Cache, CachedFile
+from engine.converters import fingerprint
+from engine.pageindex import page_index
+from engine.path import Path
+from engine.store import CacheStore
+
+
+class WikiTestCase(unittest.TestCase):
+
+	def setUp(self):
+		directory = tempfile.TemporaryDirectory()
+		self.addCleanup(directory.cleanup)
+		self.directory = Path(directory.name)
+		self.root = self.directory / 'wiki'
+		self.root.mkdir()
+		# links are resolved relative to wiki directory in current directory
+		self.addCleanup(os.chdir, os.getcwd())
+		os.chdir(self.directory)
+		patcher = mock.patch.object(page_index, 'root', self.root)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+
+class MigrationTestCase(WikiTestCase):
+
+	def test_links_of_documents_version_1(self):
+		(self.root / 'a.md').write_text('See [[b]].', encoding='utf-8')
+		(self.root / 'b.md').write_text('Linked page.', encoding='utf-8')
+		# store written before link graph: markup of the old wikilinks extension without linked paths
+		store = CacheStore(self.directory / 'cache.sqlite')
+		store.version = 3
+		store.set_meta('converters', fingerprint())
+		store.set_meta('documents', '1')
+		store.put([
+			('a.md', CachedFile.from_file(self.root / 'a.md', '<p>See <a class="wikilink" href="/wiki/b">b</a>.</p>').serialize()),
+			('b.md', CachedFile.from_file(self.root / 'b.md', '<p>Linked page.</p>').serialize()),
+		])
+		cache = Cache(self.directory / 'cache.sqlite', root=self.root, preload=True, preload_workers=1)
+		self.assertEqual(cache.store.backlinks('b.md'), ['a.md'])
+		self.assertIn('data-wiki-target="b.md"', cache.get_content(self.root / 'a.md'))
+		self.assertEqual(cache.store.get_meta('documents'), '2')
+
+
+class LinksTestCase(WikiTestCase):
+
+	def test_link_to_created_file(self):
+		(self.root / 'Alpha.md').write_text('See [[Foo]].', encoding='utf-8')
+		cache = Cache(self.directory / 'cache.sqlite', root=self.root, preload=True, preload_workers=1)
+		self.assertEqual(cache.broken_links(), [('Alpha.md', 'Foo', '')])
+		(self.root / 'Foo.md').write_text('Created later.', encoding='utf-8')
+		page_index.clear()
+		# link graph is resolved again on read before linking page is reconverted
+		self.assertEqual(cache.broken_links(), [])
+		self.assertEqual(cache.backlinks('Foo.md'), ['Alpha.md'])
+		cache.invalidate({self.root / 'Foo.md'})
+		self.assertEqual(cache.store.broken_links(), [])
+		self.assertEqual(cache.store.backlinks('Foo.md'), ['Alpha.md'])
+		self.assertIn('data-wiki-target="Foo.md"', cache.get_content(self.root / 'Alpha.md'))
+
+
+class ConversionTestCase(WikiTestCase):
+
+	def test_file_changed_during_conversion(self):
+		file = self.root / 'a.md'
+		file.write_text('old', encoding='utf-8')
+
+		def convert(path):
+			content = path.read_text(encoding='utf-8')
+			path.write_text('changed meanwhile', encoding='utf-8')
+			return content
+
+		cache = Cache(self.directory / 'cache.sqlite', root=self.root, preload=False)
+		with mock.patch('engine.cache.get_content', convert):
+			cached = cache.get_entry(file)
+		self.assertEqual(cached.content, 'old')
+		# hashes belong to converted content so the change is not hidden
+		self.assertTrue(cached.has_changed(file))
+
+
+class EvictionTestCase(WikiTestCase):
+
+	def test_unsaved_contents_are_kept_until_saved(self):
+		cache = Cache(self.directory / 'cache.sqlite', root=self.root, preload=False, memory_limit=1)
+		for key in ('a.txt', 'b.txt'):
+			(self.root / key).write_text(key, encoding='utf-8')
+			with cache._lock:
+				cache.files[key] = cached = CachedFile.from_file(self.root / key, key)
+				cache._dirty.add(key)
+				cache._touch(key, cached)
+		# nothing is written to store under lock so dirty contents stay in memory
+		self.assertEqual(cache.evictions, 0)
+		self.assertIsNone(cache.store.content('a.txt'))
+		cache.save()
+		self.assertEqual(cache.evictions, 1)
+		self.assertFalse(cache.files['a.txt'].loaded)
+		self.assertEqual(cache.get_content(self.root / 'a.txt'), 'a.txt')
+
+
+if __name__ == '__main__':
+	unittest.main()
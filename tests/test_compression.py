@@ -0,0 +1,36 @@
+import gzip
+import os
+import tempfile
+import threading
+import unittest
+
+from engine.compression import precompressed
+from engine.path import Path
+
+
+class PrecompressedTestCase(unittest.TestCase):
+
+	def test_concurrent_build(self):
+		with tempfile.TemporaryDirectory() as directory:
+			file = Path(directory) / 'big.js'
+			data = os.urandom(1 << 20).hex().encode('ascii') * 3
+			file.write_bytes(data)
+			results = []
+			barrier = threading.Barrier(6)
+
+			def build():
+				barrier.wait()
+				results.append(precompressed(file, 'gzip'))
+
+			threads = [threading.Thread(target=build) for _ in range(6)]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+			self.assertEqual(results, [file.with_name('big.js.gz')] * 6)
+			self.assertEqual(gzip.decompress(results[0].read_bytes()), data)
+			self.assertEqual([f.name for f in Path(directory).iterdir() if f.name.endswith('.tmp')], [])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,46 @@
+import tempfile
+import unittest
+
+from engine.path import Path
+from engine.search import make_document, SearchIndex
+from engine.store import CacheStore
+
+
+class SearchIndexTestCase(unittest.TestCase):
+
+	def setUp(self):
+		directory = tempfile.TemporaryDirectory()
+		self.addCleanup(directory.cleanup)
+		self.store = CacheStore(Path(directory.name) / 'cache.sqlite')
+		self.store.put((), [
+			make_document('Alpha.md', '<h1>Greeting</h1><p>Hello world</p>'),
+			make_document('notes/Beta.md', '<p>hello hello and helloworld</p>'),
+			make_document('Gamma.md', '<p>Othello</p>'),
+		])
+
+	def test_substring(self):
+		index = SearchIndex(self.store)
+		self.assertEqual(sorted(index.rank('ELLO')[0]), ['Alpha.md', 'Gamma.md', 'notes/Beta.md'])
+		self.assertEqual(index.rank('notes/b'), (['notes/Beta.md'], False))
+		self.assertEqual(index.rank('he'), ([], False))
+
+	def test_rank(self):
+		index = SearchIndex(self.store)
+		# pages containing query only inside other words follow scored ones
+		self.assertEqual(index.rank('hello'), (['notes/Beta.md', 'Alpha.md', 'Gamma.md'], False))
+		self.assertEqual(index.rank('hello', offset=1, limit=1), (['Alpha.md'], True))
+
+	def test_changes_of_other_processes(self):
+		index = SearchIndex(self.store)
+		self.assertEqual(index.suggest('gr'), [{'title': 'Greeting', 'url': '/wiki/Alpha', 'type': 'heading'}])
+		# documents written by another store sharing database
+		other = CacheStore(self.store.path)
+		other.delete(['Alpha.md'])
+		other.put((), [make_document('Gamma.md', '<p>Goodbye</p>')])
+		self.assertEqual(index.rank('hello'), (['notes/Beta.md'], False))
+		self.assertEqual(index.suggest('gr'), [])
+		self.assertGreater(index.stats()['trigrams'], 0)
+
+
+if __name__ == '__main__':
+	unittest.main()